@@ -0,0 +1,33 @@
+"""Benchmark del motor de asignación sobre horizontes de hasta 365 días.
+
+Uso: python benchmarks/bench_motor.py [num_enfermeras]
+
+Si las reglas de días consecutivos y descanso son de coste constante, el
+tiempo por fila de demanda debe mantenerse estable al alargar el horizonte.
+"""
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from datos_sinteticos import ConfigHospital, hospital_sintetico  # noqa: E402
+from motor_asignacion import cargar_plantilla, ejecutar_asignacion  # noqa: E402
+
+
+def main(n=1000):
+    staff, demand_anual = hospital_sintetico(ConfigHospital(enfermeras=n, dias=365))
+    plantilla = cargar_plantilla(staff)
+    fechas = demand_anual["Fecha"].unique()
+    print(f"{'días':>5} {'filas':>7} {'asignadas':>10} {'segundos':>9} {'µs/fila':>9}")
+    for dias in (30, 90, 180, 365):
+        demand = demand_anual[demand_anual["Fecha"].isin(fechas[:dias])]
+        t0 = time.perf_counter()
+        df_assign, _ = ejecutar_asignacion(plantilla, demand)
+        dt = time.perf_counter() - t0
+        print(f"{dias:>5} {len(demand):>7} {len(df_assign):>10} {dt:>9.3f} {dt / len(demand) * 1e6:>9.1f}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1000)
@@ -0,0 +1,53 @@
+"""Benchmark de la asignación por unidades en paralelo frente a la ejecución en serie.
+
+Uso: python benchmarks/bench_paralelo.py [num_unidades] [enfermeras_por_unidad]
+
+Genera un hospital con muchas unidades y un año de demanda, lo resuelve con 1, 2,
+4, ... procesos (hasta los núcleos disponibles) y comprueba que el resultado es
+idéntico al de la ejecución en serie.
+"""
+import sys
+import time
+from pathlib import Path
+
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from datos_sinteticos import ConfigHospital, hospital_sintetico  # noqa: E402
+from motor_asignacion import MAX_PROCESOS, cargar_plantilla, ejecutar_asignacion  # noqa: E402
+
+
+def main(num_unidades=24, por_unidad=200):
+    unidades = [f"Unidad {i:02d}" for i in range(num_unidades)]
+    staff, demand = hospital_sintetico(ConfigHospital(
+        enfermeras=num_unidades * por_unidad, dias=365, unidades=unidades, semilla=7
+    ))
+    plantilla = cargar_plantilla(staff)
+
+    niveles = [p for p in (1, 2, 4, 8, 16, 32) if p <= MAX_PROCESOS]
+    print(f"{len(unidades)} unidades, {len(plantilla)} enfermeras, {len(demand)} filas de demanda")
+    print(f"{'procesos':>8} {'segundos':>9} {'speedup':>8} {'idéntico':>9}")
+    base = None
+    for procesos in niveles:
+        t0 = time.perf_counter()
+        df_assign, df_uncov = ejecutar_asignacion(plantilla, demand, procesos=procesos)
+        dt = time.perf_counter() - t0
+        if base is None:
+            base, referencia = dt, (df_assign, df_uncov)
+        identico = all(_iguales(a, b) for a, b in zip(referencia, (df_assign, df_uncov)))
+        print(f"{procesos:>8} {dt:>9.3f} {base / dt:>8.2f} {'sí' if identico else 'NO':>9}")
+
+
+def _iguales(a, b):
+    try:
+        pd.testing.assert_frame_equal(a, b)
+    except AssertionError:
+        return False
+    return True
+
+
+if __name__ == "__main__":
+    args = [int(a) for a in sys.argv[1:3]]
+    main(*args)
@@ -0,0 +1,51 @@
+"""Comprobación de regresión: la asignación no depende de cómo se cargaron las entradas.
+
+Uso: python benchmarks/comprobar_entradas.py [enfermeras] [dias]
+
+Escribe un hospital sintético a CSV, lo vuelve a leer con `leer_plantilla` y
+`leer_demanda` (unidades y turnos categóricos, como en las páginas) y comprueba
+que `ejecutar_asignacion` da exactamente las mismas asignaciones que con los
+DataFrames originales, que cada enfermera figura en el turno de su contrato y que
+las horas corresponden al turno. Termina con código 1 si algo no cuadra.
+"""
+import sys
+from pathlib import Path
+
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from datos_sinteticos import hospital_sintetico  # noqa: E402
+from entradas import leer_demanda, leer_plantilla  # noqa: E402
+from motor_asignacion import SHIFT_HOURS, ejecutar_asignacion  # noqa: E402
+
+
+def _como_texto(df):
+    return df.astype({c: str for c in df.columns if c != "Horas"}).reset_index(drop=True)
+
+
+def main(enfermeras=300, dias=90):
+    staff, demand = hospital_sintetico(enfermeras=enfermeras, dias=dias)
+    staff_leida, plantilla = leer_plantilla(staff.to_csv(index=False).encode("utf-8"))
+    demand_leida = leer_demanda(demand.to_csv(index=False).encode("utf-8"))
+
+    referencia, _ = ejecutar_asignacion(staff, demand)
+    df_assign, _ = ejecutar_asignacion(plantilla, demand_leida)
+
+    turnos = df_assign["Turno"].astype(str)
+    contrato = df_assign["ID_Enfermera"].astype(str).map(staff_leida.set_index("ID")["Turno_Contrato"].astype(str))
+    errores = {
+        "distinta de la referencia": 0 if _como_texto(referencia).equals(_como_texto(df_assign)) else len(df_assign),
+        "turno distinto del contrato": int((turnos != contrato).sum()),
+        "horas distintas del turno": int((df_assign["Horas"] != turnos.map(SHIFT_HOURS)).sum()),
+    }
+    print(f"{len(df_assign)} asignaciones con entradas leídas de CSV")
+    for motivo, n in errores.items():
+        print(f"  {motivo}: {n}")
+    return not any(errores.values())
+
+
+if __name__ == "__main__":
+    args = [int(a) for a in sys.argv[1:3]]
+    sys.exit(0 if main(*args) else 1)
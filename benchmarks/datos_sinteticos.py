@@ -0,0 +1,88 @@
+"""Generador reproducible de hospitales sintéticos (plantilla y demanda) para benchmarks.
+
+La demanda se ajusta a la capacidad de cada (unidad, turno): cada día se piden
+aproximadamente `cobertura` veces las jornadas que la plantilla puede aportar de
+media, con menos personal los fines de semana. Así el motor trabaja cerca de su
+límite sin que la mayoría de los turnos queden imposibles de cubrir.
+"""
+from dataclasses import dataclass, field
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+from motor_asignacion import BASE_MAX_JORNADAS, COLUMNAS_DEMANDA, FACTOR_PARCIAL
+
+UNIDADES = ["Medicina Interna", "UCI", "Urgencias", "Oncología", "Quirófano"]
+MEZCLA_TURNOS = {"Mañana": 0.4, "Tarde": 0.35, "Noche": 0.25}
+FACTOR_FIN_DE_SEMANA = 0.7
+
+
+@dataclass
+class ConfigHospital:
+    """Parámetros del hospital sintético; la misma configuración genera siempre los mismos datos"""
+    enfermeras: int = 1000
+    dias: int = 365
+    inicio: date = date(2025, 1, 1)
+    unidades: list = field(default_factory=lambda: list(UNIDADES))
+    mezcla_turnos: dict = field(default_factory=lambda: dict(MEZCLA_TURNOS))
+    proporcion_parcial: float = 0.2
+    densidad_ausencias: float = 0.03  # fracción de días del horizonte no disponibles
+    cobertura: float = 0.9            # demanda diaria / capacidad media diaria
+    semilla: int = 42
+
+
+def generar_plantilla(config):
+    """Plantilla con las columnas que espera `cargar_plantilla`"""
+    rng = np.random.default_rng(config.semilla)
+    n = config.enfermeras
+    turnos = list(config.mezcla_turnos)
+    pesos = np.array([config.mezcla_turnos[t] for t in turnos], dtype=float)
+
+    fechas = pd.date_range(config.inicio, periods=config.dias, freq="D").strftime("%Y-%m-%d").to_numpy()
+    n_ausencias = rng.binomial(config.dias, config.densidad_ausencias, n)
+    ausencias = [
+        ", ".join(sorted(rng.choice(fechas, k, replace=False))) if k else None
+        for k in n_ausencias
+    ]
+    return pd.DataFrame({
+        "ID": [f"E{i:05d}" for i in range(n)],
+        "Unidad_Asignada": rng.choice(config.unidades, n),
+        "Jornada": np.where(rng.random(n) < config.proporcion_parcial, "Parcial", "Completa"),
+        "Turno_Contrato": rng.choice(turnos, n, p=pesos / pesos.sum()),
+        "Fechas_No_Disponibilidad": ausencias,
+    })
+
+
+def generar_demanda(config, staff):
+    """Demanda diaria por unidad y turno proporcional a la capacidad de `staff`"""
+    rng = np.random.default_rng(config.semilla + 1)
+    factor = np.where(staff["Jornada"] == "Parcial", FACTOR_PARCIAL, 1.0)
+    jornadas_dia = factor * staff["Turno_Contrato"].map(BASE_MAX_JORNADAS).to_numpy() / 365
+    capacidad = (pd.Series(jornadas_dia * (1 - config.densidad_ausencias))
+                 .groupby([staff["Unidad_Asignada"], staff["Turno_Contrato"]]).sum())
+
+    fechas = pd.date_range(config.inicio, periods=config.dias, freq="D")
+    semana = np.where(fechas.weekday >= 5, FACTOR_FIN_DE_SEMANA, 1.0)
+    # Los fines de semana piden menos: se compensa para mantener la media en `cobertura`
+    semana = semana / semana.mean()
+
+    bloques = []
+    for unidad in config.unidades:
+        for turno in config.mezcla_turnos:
+            media = capacidad.get((unidad, turno), 0.0) * config.cobertura * semana
+            bloques.append(pd.DataFrame({
+                "Fecha": fechas.strftime("%Y-%m-%d"),
+                "Unidad": unidad,
+                "Turno": turno,
+                "Personal_Requerido": rng.poisson(media),
+            }))
+    demand = pd.concat(bloques, ignore_index=True)[COLUMNAS_DEMANDA]
+    return demand.sort_values("Fecha", kind="stable", ignore_index=True)
+
+
+def hospital_sintetico(config=None, **parametros):
+    """Devuelve `(staff, demand)` para `config` o para `ConfigHospital(**parametros)`"""
+    config = config or ConfigHospital(**parametros)
+    staff = generar_plantilla(config)
+    return staff, generar_demanda(config, staff)
@@ -0,0 +1,160 @@
+"""Suite de benchmarks del motor y de la base de datos.
+
+Uso:
+    python benchmarks/suite.py                      # todas las escalas
+    python benchmarks/suite.py --escalas 100x31 1000x365
+    python benchmarks/suite.py --comparar benchmarks/resultados/anterior.json
+
+Para cada escala (enfermeras × días) genera un hospital sintético y mide la
+asignación, `guardar_asignaciones` (carga inicial y repetida), `guardar_resumen_mensual`
+y las consultas de histórico sobre una base de datos temporal. Los resultados se
+guardan en JSON en `benchmarks/resultados/` para comparar entre versiones.
+"""
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+RAIZ = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(RAIZ))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+import db_manager  # noqa: E402
+from datos_sinteticos import ConfigHospital, hospital_sintetico  # noqa: E402
+from motor_asignacion import cargar_plantilla, ejecutar_asignacion, resumen_mensual  # noqa: E402
+
+ESCALAS = ["100x31", "100x365", "1000x31", "1000x365", "10000x31", "10000x365"]
+DIR_RESULTADOS = Path(__file__).resolve().parent / "resultados"
+
+
+def _cronometrar(tiempos, nombre, funcion, repeticiones=1):
+    """Ejecuta `funcion` y guarda en `tiempos[nombre]` el mejor tiempo; devuelve su resultado"""
+    mejor, resultado = None, None
+    for _ in range(repeticiones):
+        t0 = time.perf_counter()
+        resultado = funcion()
+        dt = time.perf_counter() - t0
+        mejor = dt if mejor is None else min(mejor, dt)
+    tiempos[nombre] = round(mejor, 4)
+    return resultado
+
+
+def _usar_bd(path):
+    db_manager.cerrar_conexiones()
+    db_manager.DB_PATH = Path(path)
+    db_manager.init_db()
+
+
+def medir_escala(enfermeras, dias, repeticiones=1, con_bd=True):
+    tiempos = {}
+    config = ConfigHospital(enfermeras=enfermeras, dias=dias)
+    staff, demand = _cronometrar(tiempos, "generar_datos", lambda: hospital_sintetico(config))
+    plantilla = _cronometrar(tiempos, "cargar_plantilla", lambda: cargar_plantilla(staff))
+    df_assign, df_uncov = _cronometrar(
+        tiempos, "ejecutar_asignacion", lambda: ejecutar_asignacion(plantilla, demand), repeticiones
+    )
+    resumen = _cronometrar(tiempos, "resumen_mensual", lambda: resumen_mensual(df_assign))
+
+    if con_bd:
+        with tempfile.TemporaryDirectory() as tmp:
+            _usar_bd(Path(tmp) / "turnos.db")
+            _cronometrar(tiempos, "guardar_asignaciones", lambda: db_manager.guardar_asignaciones(df_assign))
+            _cronometrar(tiempos, "guardar_asignaciones_repetido",
+                         lambda: db_manager.guardar_asignaciones(df_assign), repeticiones)
+            _cronometrar(tiempos, "guardar_resumen_mensual",
+                         lambda: db_manager.guardar_resumen_mensual(resumen), repeticiones)
+            _cronometrar(tiempos, "obtener_totales_enfermeras",
+                         lambda: db_manager.obtener_totales_enfermeras(ids=staff["ID"]), repeticiones)
+            muestra = staff["ID"].iloc[::max(1, enfermeras // 50)]
+            _cronometrar(tiempos, "obtener_horas_historicas",
+                         lambda: db_manager.obtener_horas_historicas(ids=muestra), repeticiones)
+            _cronometrar(tiempos, "obtener_historico_anual",
+                         lambda: db_manager.obtener_historico_anual(staff["ID"], config.inicio.year), repeticiones)
+            _cronometrar(tiempos, "obtener_acumulados_anuales",
+                         db_manager.obtener_acumulados_anuales, repeticiones)
+            db_manager.cerrar_conexiones()
+
+    return {
+        "enfermeras": enfermeras,
+        "dias": dias,
+        "filas_demanda": len(demand),
+        "asignaciones": len(df_assign),
+        "sin_cubrir": int(df_uncov["Faltan"].sum()) if len(df_uncov) else 0,
+        "tiempos": tiempos,
+    }
+
+
+def _version():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=RAIZ,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def comparar(actual, anterior):
+    """Imprime la relación de tiempos actual / anterior para las mediciones comunes"""
+    previos = {(r["enfermeras"], r["dias"]): r["tiempos"] for r in anterior["resultados"]}
+    print(f"\nComparación con {anterior.get('version') or '?'} ({anterior.get('fecha', '?')})")
+    for r in actual["resultados"]:
+        previo = previos.get((r["enfermeras"], r["dias"]))
+        if not previo:
+            continue
+        for nombre, t in r["tiempos"].items():
+            if previo.get(nombre):
+                ratio = t / previo[nombre]
+                aviso = "  ⚠️" if ratio > 1.2 else ""
+                print(f"  {r['enfermeras']:>6}×{r['dias']:<4} {nombre:<32} {previo[nombre]:>9.4f} → {t:>9.4f} "
+                      f"(×{ratio:.2f}){aviso}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--escalas", nargs="+", default=ESCALAS, help="enfermerasxdías, p. ej. 1000x365")
+    parser.add_argument("--repeticiones", type=int, default=1)
+    parser.add_argument("--sin-bd", action="store_true", help="medir solo el motor")
+    parser.add_argument("--salida", type=Path, help="archivo JSON de resultados")
+    parser.add_argument("--comparar", type=Path, help="JSON de una ejecución anterior")
+    args = parser.parse_args(argv)
+
+    informe = {
+        "fecha": datetime.now().isoformat(timespec="seconds"),
+        "version": _version(),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+        "resultados": [],
+    }
+    ruta_bd = db_manager.DB_PATH
+    try:
+        for escala in args.escalas:
+            enfermeras, dias = (int(x) for x in escala.lower().split("x"))
+            r = medir_escala(enfermeras, dias, args.repeticiones, con_bd=not args.sin_bd)
+            informe["resultados"].append(r)
+            print(f"{enfermeras:>6} enfermeras × {dias:>3} días: {r['asignaciones']} asignaciones, "
+                  f"{r['sin_cubrir']} sin cubrir")
+            for nombre, t in r["tiempos"].items():
+                print(f"    {nombre:<32} {t:>9.4f} s")
+    finally:
+        db_manager.cerrar_conexiones()
+        db_manager.DB_PATH = ruta_bd
+
+    salida = args.salida or DIR_RESULTADOS / f"{datetime.now():%Y%m%d_%H%M%S}_{informe['version'] or 'local'}.json"
+    salida.parent.mkdir(parents=True, exist_ok=True)
+    salida.write_text(json.dumps(informe, indent=2, ensure_ascii=False))
+    print(f"\nResultados guardados en {salida}")
+
+    if args.comparar:
+        comparar(informe, json.loads(args.comparar.read_text()))
+
+
+if __name__ == "__main__":
+    main()
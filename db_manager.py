@@ -1,30 +1,96 @@
 import sqlite3
+import threading
+import weakref
 import pandas as pd
-import gdown
 import shutil
 from pathlib import Path
 from datetime import datetime, timedelta
+from entradas import CacheLRU
+from instrumentacion import contar, instrumentado
+from motor_asignacion import MAX_DIAS_CONSECUTIVOS
 
 DB_PATH = Path("turnos.db")
 
+# === Conexión compartida ===
+# Una conexión por hilo (Streamlit atiende cada sesión en su propio hilo), que se
+# cierra cuando el hilo termina: Streamlit y el pool de trabajos crean hilos nuevos
+# a menudo. `cerrar_conexiones` las invalida todas, p. ej. antes de sustituir el
+# archivo de la base de datos.
+PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "busy_timeout": 5000,
+    "temp_store": "MEMORY",
+    "cache_size": -20000,
+}
+
+_local = threading.local()
+_conexiones = set()  # finalizadores de las conexiones abiertas
+_conexiones_lock = threading.Lock()
+_generacion = 0
+
+class _Titular:
+    """Conexión de un hilo; al liberarse (el hilo termina o la conexión se renueva) se cierra"""
+
+    def __init__(self, conn, clave):
+        self.conn, self.clave = conn, clave
+
+def _cerrar(conn):
+    try:
+        conn.close()
+    except sqlite3.Error:
+        pass
+
+def obtener_conexion():
+    """Devuelve la conexión SQLite del hilo actual, abriéndola la primera vez"""
+    clave = (str(DB_PATH), _generacion)
+    titular = getattr(_local, "titular", None)
+    if titular is None or titular.clave != clave:
+        conn = sqlite3.connect(DB_PATH, check_same_thread=False)
+        for nombre, valor in PRAGMAS.items():
+            conn.execute(f"PRAGMA {nombre} = {valor}")
+        titular = _Titular(conn, clave)
+        with _conexiones_lock:
+            _conexiones.difference_update([f for f in _conexiones if not f.alive])
+            _conexiones.add(weakref.finalize(titular, _cerrar, conn))
+        _local.titular = titular
+    return titular.conn
+
+def cerrar_conexiones():
+    """Cierra todas las conexiones abiertas; cada hilo abrirá una nueva al volver a pedirla"""
+    global _generacion
+    with _conexiones_lock:
+        for finalizador in _conexiones:
+            finalizador()
+        _conexiones.clear()
+        _generacion += 1
+
 # === Sincronización con Google Drive ===
 def descargar_bd_desde_drive(file_id):
-    url = f"https://drive.google.com/uc?id={file_id}"
-    output = str(DB_PATH)
+    """Descarga la BBDD de Drive solo si ha cambiado y no hay cambios locales sin subir.
+
+    Se puede llamar en cada rerun de Streamlit: la comprobación se hace una vez por proceso.
+    """
+    from sincronizacion import RemotoDrive, marcar_sincronizado, sincronizar_bd
     try:
-        gdown.download(url, output, quiet=False)
-        print("📥 Base de datos descargada desde Google Drive")
+        if sincronizar_bd(RemotoDrive(file_id), DB_PATH):
+            # Las migraciones sobre la copia recién bajada no cuentan como cambios locales
+            init_db()
+            marcar_sincronizado(DB_PATH)
+            print("📥 Base de datos descargada desde Google Drive")
     except Exception as e:
         print("❌ No se pudo descargar la base de datos:", e)
 
 def subir_bd_a_drive(file_id):
-    print("🔁 Subida automática a Google Drive aún no implementada directamente. Usa el archivo generado y súbelo manualmente.")
-    # Implementar subida con PyDrive si se requiere autenticación completa
+    from sincronizacion import RemotoDrive, subir_bd
+    try:
+        subir_bd(RemotoDrive(file_id), DB_PATH)
+    except NotImplementedError as e:
+        print(f"🔁 {e}")
+        # Implementar subida con PyDrive si se requiere autenticación completa
 
 # === Funciones de gestión local ===
-def init_db():
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
+def _migracion_tablas(c):
     c.execute('''
         CREATE TABLE IF NOT EXISTS asignaciones (
             Fecha TEXT,
@@ -47,85 +113,541 @@ def init_db():
             Horas_Asignadas REAL
         )
     ''')
-    conn.commit()
-    conn.close()
+
+def _migracion_clave_asignaciones(c):
+    # Clave única de asignación: elimina duplicados de versiones anteriores antes de crearla.
+    # Al empezar por (Fecha, Unidad, Turno) sirve también de índice para esas búsquedas.
+    c.execute('''
+        DELETE FROM asignaciones WHERE rowid NOT IN (
+            SELECT MAX(rowid) FROM asignaciones
+            GROUP BY Fecha, Unidad, Turno, ID_Enfermera
+        )
+    ''')
+    c.execute('''
+        CREATE UNIQUE INDEX IF NOT EXISTS ux_asignaciones
+        ON asignaciones (Fecha, Unidad, Turno, ID_Enfermera)
+    ''')
+
+def _migracion_resumen_incremental(c):
+    # El resumen anterior puede contar asignaciones duplicadas (ya eliminadas en la
+    # migración previa) o faltarle meses: se reconstruye entero desde asignaciones
+    c.execute("DELETE FROM resumen_mensual")
+    c.execute('''
+        CREATE UNIQUE INDEX IF NOT EXISTS ux_resumen_mensual
+        ON resumen_mensual (ID, Unidad, Turno, Jornada, Año, Mes)
+    ''')
+    _crear_triggers_resumen(c)
+    _recalcular_resumen(c)
+
+def _migracion_indices(c):
+    c.execute('''
+        CREATE INDEX IF NOT EXISTS ix_asignaciones_enfermera_fecha
+        ON asignaciones (ID_Enfermera, Fecha)
+    ''')
+    c.execute('''
+        CREATE INDEX IF NOT EXISTS ix_resumen_mensual_periodo
+        ON resumen_mensual (Año, Mes)
+    ''')
+
+def _migracion_triggers_carga_masiva(c):
+    # Recrea los triggers del resumen para que puedan suspenderse durante las cargas en bloque
+    _crear_triggers_resumen(c)
+
+def _migracion_indice_filtros_resumen(c):
+    # Filtros del visor del resumen por unidad/turno/jornada y sus listas de valores distintos
+    c.execute('''
+        CREATE INDEX IF NOT EXISTS ix_resumen_mensual_filtros
+        ON resumen_mensual (Unidad, Turno, Jornada, Año, Mes)
+    ''')
+
+def _migracion_acumulados_anuales(c):
+    # Totales anuales por (ID, Año, Turno) para sembrar los límites sin recorrer el histórico
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS acumulados_anuales (
+            ID TEXT NOT NULL,
+            Año INTEGER NOT NULL,
+            Turno TEXT NOT NULL,
+            Jornadas_Asignadas INTEGER NOT NULL,
+            Horas_Asignadas REAL NOT NULL,
+            PRIMARY KEY (ID, Año, Turno)
+        ) WITHOUT ROWID
+    ''')
+    _crear_triggers_acumulados(c)
+    # Se parte del resumen, que `_migracion_resumen_incremental` reconstruyó desde asignaciones
+    c.execute("DELETE FROM acumulados_anuales")
+    c.execute('''
+        INSERT INTO acumulados_anuales (ID, Año, Turno, Jornadas_Asignadas, Horas_Asignadas)
+        SELECT ID, Año, Turno, SUM(Jornadas_Asignadas), SUM(Horas_Asignadas)
+        FROM resumen_mensual
+        GROUP BY ID, Año, Turno
+    ''')
+
+def _migracion_versiones_historico(c):
+    # Sello de cambios por (ID, Año) para detectar aprobaciones concurrentes
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS versiones_historico (
+            ID TEXT NOT NULL,
+            Año INTEGER NOT NULL,
+            Version INTEGER NOT NULL,
+            PRIMARY KEY (ID, Año)
+        ) WITHOUT ROWID
+    ''')
+    c.execute("CREATE INDEX IF NOT EXISTS ix_versiones_historico_version ON versiones_historico (Version)")
+    _crear_triggers_versiones(c)
+
+# Cada migración se aplica una sola vez; PRAGMA user_version guarda cuántas van aplicadas
+MIGRACIONES = [
+    _migracion_tablas,
+    _migracion_clave_asignaciones,
+    _migracion_resumen_incremental,
+    _migracion_indices,
+    _migracion_triggers_carga_masiva,
+    _migracion_indice_filtros_resumen,
+    _migracion_acumulados_anuales,
+    _migracion_versiones_historico,
+]
+
+@instrumentado("bd.init_db")
+def init_db():
+    """Crea el esquema y aplica las migraciones pendientes en una transacción"""
+    conn = obtener_conexion()
+    if conn.execute("PRAGMA user_version").fetchone()[0] >= len(MIGRACIONES):
+        return
+    with conn:
+        c = conn.cursor()
+        c.execute("BEGIN IMMEDIATE")
+        version = c.execute("PRAGMA user_version").fetchone()[0]
+        for migracion in MIGRACIONES[version:]:
+            migracion(c)
+        c.execute(f"PRAGMA user_version = {len(MIGRACIONES)}")
+
+RESUMEN_KEY = "ID, Unidad, Turno, Jornada, Año, Mes"
+
+def _upsert_resumen(signo, fila):
+    """Sentencia que suma (signo '+') o resta (signo '-') una asignación al resumen mensual"""
+    return f'''
+        INSERT INTO resumen_mensual ({RESUMEN_KEY}, Jornadas_Asignadas, Horas_Asignadas)
+        VALUES ({fila}.ID_Enfermera, {fila}.Unidad, {fila}.Turno, {fila}.Jornada,
+                CAST(strftime('%Y', {fila}.Fecha) AS INTEGER),
+                CAST(strftime('%m', {fila}.Fecha) AS INTEGER),
+                {signo}1, {signo}{fila}.Horas)
+        ON CONFLICT ({RESUMEN_KEY}) DO UPDATE SET
+            Jornadas_Asignadas = Jornadas_Asignadas + excluded.Jornadas_Asignadas,
+            Horas_Asignadas = Horas_Asignadas + excluded.Horas_Asignadas;
+    '''
+
+def _crear_triggers_resumen(c):
+    """Mantiene resumen_mensual al día con cada alta, baja o cambio en asignaciones.
+
+    Los triggers se desactivan mientras `control_resumen.carga_masiva` vale 1, que es
+    como `guardar_asignaciones` aplica el resumen de forma agregada en cargas grandes.
+    """
+    c.execute("CREATE TABLE IF NOT EXISTS control_resumen (carga_masiva INTEGER NOT NULL)")
+    if not c.execute("SELECT 1 FROM control_resumen").fetchone():
+        c.execute("INSERT INTO control_resumen VALUES (0)")
+    for nombre in ("trg_resumen_insert", "trg_resumen_delete", "trg_resumen_update"):
+        c.execute(f"DROP TRIGGER IF EXISTS {nombre}")
+
+    activo = "(SELECT carga_masiva FROM control_resumen) = 0"
+    limpiar = '''
+        DELETE FROM resumen_mensual
+        WHERE ID = OLD.ID_Enfermera AND Unidad = OLD.Unidad AND Turno = OLD.Turno
+          AND Jornada = OLD.Jornada
+          AND Año = CAST(strftime('%Y', OLD.Fecha) AS INTEGER)
+          AND Mes = CAST(strftime('%m', OLD.Fecha) AS INTEGER)
+          AND Jornadas_Asignadas <= 0;
+    '''
+    c.execute(f'''
+        CREATE TRIGGER trg_resumen_insert AFTER INSERT ON asignaciones
+        WHEN {activo}
+        BEGIN {_upsert_resumen("+", "NEW")} END
+    ''')
+    c.execute(f'''
+        CREATE TRIGGER trg_resumen_delete AFTER DELETE ON asignaciones
+        WHEN {activo}
+        BEGIN {_upsert_resumen("-", "OLD")} {limpiar} END
+    ''')
+    c.execute(f'''
+        CREATE TRIGGER trg_resumen_update AFTER UPDATE ON asignaciones
+        WHEN {activo} AND (
+            OLD.Jornada IS NOT NEW.Jornada OR OLD.Horas IS NOT NEW.Horas
+            OR OLD.Fecha IS NOT NEW.Fecha OR OLD.Unidad IS NOT NEW.Unidad
+            OR OLD.Turno IS NOT NEW.Turno OR OLD.ID_Enfermera IS NOT NEW.ID_Enfermera)
+        BEGIN {_upsert_resumen("-", "OLD")} {_upsert_resumen("+", "NEW")} {limpiar} END
+    ''')
+
+def _upsert_acumulados(signo, fila):
+    """Sentencia que suma o resta una fila del resumen mensual a su acumulado anual"""
+    return f'''
+        INSERT INTO acumulados_anuales (ID, Año, Turno, Jornadas_Asignadas, Horas_Asignadas)
+        VALUES ({fila}.ID, {fila}.Año, {fila}.Turno,
+                {signo}{fila}.Jornadas_Asignadas, {signo}{fila}.Horas_Asignadas)
+        ON CONFLICT (ID, Año, Turno) DO UPDATE SET
+            Jornadas_Asignadas = Jornadas_Asignadas + excluded.Jornadas_Asignadas,
+            Horas_Asignadas = Horas_Asignadas + excluded.Horas_Asignadas;
+    '''
+
+def _crear_triggers_acumulados(c):
+    """Mantiene acumulados_anuales como agregado de resumen_mensual.
+
+    Cuelgan del resumen y no de asignaciones, así que se aplican igual con los
+    triggers por fila que con las cargas masivas de `guardar_asignaciones`, y
+    siempre dentro de la misma transacción.
+    """
+    for nombre in ("trg_acumulados_insert", "trg_acumulados_delete", "trg_acumulados_update"):
+        c.execute(f"DROP TRIGGER IF EXISTS {nombre}")
+    limpiar = '''
+        DELETE FROM acumulados_anuales
+        WHERE ID = OLD.ID AND Año = OLD.Año AND Turno = OLD.Turno AND Jornadas_Asignadas <= 0;
+    '''
+    c.execute(f'''
+        CREATE TRIGGER trg_acumulados_insert AFTER INSERT ON resumen_mensual
+        BEGIN {_upsert_acumulados("+", "NEW")} END
+    ''')
+    c.execute(f'''
+        CREATE TRIGGER trg_acumulados_delete AFTER DELETE ON resumen_mensual
+        BEGIN {_upsert_acumulados("-", "OLD")} {limpiar} END
+    ''')
+    c.execute(f'''
+        CREATE TRIGGER trg_acumulados_update AFTER UPDATE ON resumen_mensual
+        BEGIN {_upsert_acumulados("-", "OLD")} {_upsert_acumulados("+", "NEW")} {limpiar} END
+    ''')
+
+def _sellar_version(fila):
+    """Sentencia que marca como cambiado el (ID, Año) de una fila de asignaciones"""
+    return f'''
+        INSERT INTO versiones_historico (ID, Año, Version)
+        VALUES ({fila}.ID_Enfermera, CAST(strftime('%Y', {fila}.Fecha) AS INTEGER),
+                (SELECT COALESCE(MAX(Version), 0) + 1 FROM versiones_historico))
+        ON CONFLICT (ID, Año) DO UPDATE SET Version = excluded.Version;
+    '''
+
+def _crear_triggers_versiones(c):
+    """Sella cada alta, baja o cambio en asignaciones; en cargas masivas lo hace `_escribir_asignaciones`"""
+    for nombre in ("trg_versiones_insert", "trg_versiones_delete", "trg_versiones_update"):
+        c.execute(f"DROP TRIGGER IF EXISTS {nombre}")
+    activo = "(SELECT carga_masiva FROM control_resumen) = 0"
+    c.execute(f'''
+        CREATE TRIGGER trg_versiones_insert AFTER INSERT ON asignaciones
+        WHEN {activo}
+        BEGIN {_sellar_version("NEW")} END
+    ''')
+    c.execute(f'''
+        CREATE TRIGGER trg_versiones_delete AFTER DELETE ON asignaciones
+        WHEN {activo}
+        BEGIN {_sellar_version("OLD")} END
+    ''')
+    c.execute(f'''
+        CREATE TRIGGER trg_versiones_update AFTER UPDATE ON asignaciones
+        WHEN {activo}
+        BEGIN {_sellar_version("OLD")} {_sellar_version("NEW")} END
+    ''')
+
+def _recalcular_resumen(c, desde=None, hasta=None):
+    """Recalcula el resumen a partir de asignaciones, opcionalmente para Fecha en [desde, hasta)"""
+    filtro, params = "", ()
+    if desde is not None:
+        filtro, params = "WHERE Fecha >= ? AND Fecha < ?", (desde, hasta)
+    c.execute(f'''
+        INSERT INTO resumen_mensual ({RESUMEN_KEY}, Jornadas_Asignadas, Horas_Asignadas)
+        SELECT ID_Enfermera, Unidad, Turno, Jornada,
+               CAST(strftime('%Y', Fecha) AS INTEGER), CAST(strftime('%m', Fecha) AS INTEGER),
+               COUNT(*), SUM(Horas)
+        FROM asignaciones {filtro}
+        GROUP BY 1, 2, 3, 4, 5, 6
+    ''', params)
 
 def cargar_horas():
-    conn = sqlite3.connect(DB_PATH)
-    df = pd.read_sql_query("SELECT * FROM horas", conn)
-    conn.close()
-    return df
+    return pd.read_sql_query("SELECT * FROM horas", obtener_conexion())
+
+ASIGNACIONES_COLUMNS = ["Fecha", "Unidad", "Turno", "ID_Enfermera", "Jornada", "Horas"]
+
+ASIGNACIONES_KEY = ["Fecha", "Unidad", "Turno", "ID_Enfermera"]
 
+def _normalizar_asignaciones(df):
+    """Normaliza tipos para SQLite (fechas 'YYYY-MM-DD', textos, horas en float) y deja
+    una fila por clave; si una clave se repite prevalece la última."""
+    out = pd.DataFrame({
+        "Fecha": pd.to_datetime(df["Fecha"]).dt.strftime("%Y-%m-%d"),
+        **{col: df[col].astype(str) for col in ["Unidad", "Turno", "ID_Enfermera", "Jornada"]},
+        "Horas": df["Horas"].astype(float),
+    })
+    return out.drop_duplicates(subset=ASIGNACIONES_KEY, keep="last")
+
+def _a_tuplas(df):
+    """Filas de `df` como tuplas de tipos nativos de Python, listas para executemany"""
+    return list(zip(*(df[col].tolist() for col in df.columns)))
+
+def _resumen_de_asignaciones(df):
+    """Filas (ID, Unidad, Turno, Jornada, Año, Mes, Jornadas, Horas) de un lote normalizado"""
+    return (df.assign(Año=df["Fecha"].str[:4].astype(int), Mes=df["Fecha"].str[5:7].astype(int))
+            .groupby(["ID_Enfermera", "Unidad", "Turno", "Jornada", "Año", "Mes"])
+            .agg(Jornadas=("Fecha", "size"), Horas=("Horas", "sum"))
+            .reset_index())
+
+def _escribir_asignaciones(c, nuevas):
+    """Escribe un lote normalizado dentro de la transacción ya abierta en `c`.
+
+    El resumen mensual se ajusta por lotes: se restan los valores anteriores de
+    las claves que ya existían y se suma el resumen del lote nuevo.
+    """
+    filas = _a_tuplas(nuevas)
+    resumen = _a_tuplas(_resumen_de_asignaciones(nuevas))
+    c.execute('''
+        CREATE TEMP TABLE IF NOT EXISTS asignaciones_nuevas (
+            Fecha TEXT, Unidad TEXT, Turno TEXT, ID_Enfermera TEXT, Jornada TEXT, Horas REAL
+        )
+    ''')
+    c.execute("DELETE FROM temp.asignaciones_nuevas")
+    c.executemany("INSERT INTO temp.asignaciones_nuevas VALUES (?, ?, ?, ?, ?, ?)", filas)
+
+    # Los triggers por fila se suspenden: resumen y versiones se ajustan con sentencias agregadas
+    c.execute("UPDATE control_resumen SET carga_masiva = 1")
+    c.execute('''
+        INSERT INTO versiones_historico (ID, Año, Version)
+        SELECT n.ID_Enfermera, CAST(strftime('%Y', n.Fecha) AS INTEGER),
+               (SELECT COALESCE(MAX(Version), 0) + 1 FROM versiones_historico)
+        FROM temp.asignaciones_nuevas n
+        LEFT JOIN asignaciones a USING (Fecha, Unidad, Turno, ID_Enfermera)
+        WHERE a.ID_Enfermera IS NULL OR a.Jornada IS NOT n.Jornada OR a.Horas IS NOT n.Horas
+        GROUP BY 1, 2
+        ON CONFLICT (ID, Año) DO UPDATE SET Version = excluded.Version
+    ''')
+    c.execute(f'''
+        INSERT INTO resumen_mensual ({RESUMEN_KEY}, Jornadas_Asignadas, Horas_Asignadas)
+        SELECT a.ID_Enfermera, a.Unidad, a.Turno, a.Jornada,
+               CAST(strftime('%Y', a.Fecha) AS INTEGER), CAST(strftime('%m', a.Fecha) AS INTEGER),
+               -COUNT(*), -SUM(a.Horas)
+        FROM temp.asignaciones_nuevas n
+        JOIN asignaciones a USING (Fecha, Unidad, Turno, ID_Enfermera)
+        WHERE true
+        GROUP BY 1, 2, 3, 4, 5, 6
+        {_SUMAR_EN_RESUMEN}
+    ''')
+    c.executemany(f'''
+        INSERT INTO resumen_mensual ({RESUMEN_KEY}, Jornadas_Asignadas, Horas_Asignadas)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        {_SUMAR_EN_RESUMEN}
+    ''', resumen)
+    # Solo pueden quedar a cero las claves de las filas sustituidas, que comparten (ID, Año, Mes) con el lote
+    c.execute('''
+        DELETE FROM resumen_mensual
+        WHERE Jornadas_Asignadas <= 0 AND (ID, Año, Mes) IN (
+            SELECT DISTINCT ID_Enfermera, CAST(strftime('%Y', Fecha) AS INTEGER),
+                   CAST(strftime('%m', Fecha) AS INTEGER)
+            FROM temp.asignaciones_nuevas
+        )
+    ''')
+    c.execute('''
+        INSERT INTO asignaciones (Fecha, Unidad, Turno, ID_Enfermera, Jornada, Horas)
+        SELECT Fecha, Unidad, Turno, ID_Enfermera, Jornada, Horas
+        FROM temp.asignaciones_nuevas WHERE true
+        ON CONFLICT (Fecha, Unidad, Turno, ID_Enfermera)
+        DO UPDATE SET Jornada = excluded.Jornada, Horas = excluded.Horas
+        WHERE Jornada IS NOT excluded.Jornada OR Horas IS NOT excluded.Horas
+    ''')
+    contar("bd.filas_escritas.asignaciones", c.rowcount)
+    c.execute("UPDATE control_resumen SET carga_masiva = 0")
+    c.execute("DELETE FROM temp.asignaciones_nuevas")
+    contar("bd.filas_escritas.resumen_mensual", len(resumen))
+
+def _preparar_lote(df):
+    missing = [col for col in ASIGNACIONES_COLUMNS if col not in df.columns]
+    if missing:
+        raise ValueError(f"Faltan columnas: {missing}")
+    return _normalizar_asignaciones(df)
+
+@instrumentado("bd.guardar_asignaciones")
 def guardar_asignaciones(df):
-    required_columns = ["Fecha", "Unidad", "Turno", "ID_Enfermera", "Jornada", "Horas"]
-    conn = sqlite3.connect(DB_PATH)
-    try:
-        # Validación de columnas
-        missing = [col for col in required_columns if col not in df.columns]
-        if missing:
-            raise ValueError(f"Faltan columnas: {missing}")
-        
-        # Insertar evitando duplicados
-        cursor = conn.cursor()
-        for _, row in df.iterrows():
-            cursor.execute('''
-                INSERT OR IGNORE INTO asignaciones 
-                VALUES (?, ?, ?, ?, ?, ?)
-            ''', (row["Fecha"], row["Unidad"], row["Turno"], 
-                 row["ID_Enfermera"], row["Jornada"], row["Horas"]))
-        conn.commit()
-    except Exception as e:
-        conn.rollback()
-        raise e
-    finally:
-        conn.close()
-        
+    """Guarda las asignaciones en bloque y en una única transacción.
 
-def cargar_asignaciones():
-    conn = sqlite3.connect(DB_PATH)
-    df = pd.read_sql_query("SELECT * FROM asignaciones", conn)
-    conn.close()
+    Una misma (Fecha, Unidad, Turno, ID_Enfermera) se actualiza en lugar de
+    duplicarse, de modo que aprobar dos veces el mismo plan no suma horas.
+    No comprueba conflictos con otros planificadores (ver `aprobar_asignaciones`).
+    """
+    nuevas = _preparar_lote(df)
+    conn = obtener_conexion()
+    with conn:
+        c = conn.cursor()
+        c.execute("BEGIN IMMEDIATE")
+        _escribir_asignaciones(c, nuevas)
+    _resumen_modificado()
+
+# === Aprobación con bloqueo optimista ===
+# Cada cambio en asignaciones sella su (ID, Año) en versiones_historico con un número
+# creciente. Un plan guarda el máximo al leer el histórico y solo puede aprobarse si
+# ninguna de sus enfermeras ha cambiado después en los años de los que depende.
+class ConflictoAprobacion(ValueError):
+    """El histórico de algunas enfermeras del plan cambió después de generarlo"""
+
+    def __init__(self, conflictos):
+        self.conflictos = conflictos  # DataFrame ID, Año, Version
+        self.ids = sorted(conflictos["ID"].unique())
+        super().__init__(
+            f"{len(self.ids)} enfermeras tienen cambios guardados por otro planificador: "
+            f"{', '.join(self.ids[:10])}{'…' if len(self.ids) > 10 else ''}"
+        )
+
+def version_historico():
+    """Sello actual del histórico; se guarda con el plan al sembrarlo"""
+    return obtener_conexion().execute(
+        "SELECT COALESCE(MAX(Version), 0) FROM versiones_historico"
+    ).fetchone()[0]
+
+def _conflictos(c, nuevas, version):
+    """(ID, Año) del lote que cambiaron después de `version` en los años que siembran el plan"""
+    años = nuevas["Fecha"].str[:4].astype(int)
+    if años.empty:
+        return pd.DataFrame(columns=["ID", "Año", "Version"])
+    # Los cambios posteriores al sello suelen ser pocos: se leen por el índice de Version
+    cambios = pd.DataFrame(
+        c.execute("SELECT ID, Año, Version FROM versiones_historico WHERE Version > ?", (int(version),)).fetchall(),
+        columns=["ID", "Año", "Version"],
+    )
+    # El plan depende del año en que empieza (y del anterior, por la última fecha) hasta el último
+    return cambios[cambios["ID"].isin(set(nuevas["ID_Enfermera"]))
+                   & cambios["Año"].between(años.min() - 1, años.max())].reset_index(drop=True)
+
+@instrumentado("bd.aprobar_asignaciones")
+def aprobar_asignaciones(df, version):
+    """Guarda un plan generado con el histórico de `version` si nadie lo ha cambiado desde entonces.
+
+    Comprobación y escritura van en la misma transacción BEGIN IMMEDIATE, así que
+    dos aprobaciones simultáneas no pueden pisarse. Si alguna enfermera del plan
+    tiene cambios posteriores en los años que lo siembran, no se guarda nada y se
+    lanza `ConflictoAprobacion` con esas enfermeras.
+
+    Devuelve el sello con el que seguir trabajando sobre el plan: el de su propia
+    escritura si nadie más escribió desde `version` (así sus filas no cuentan como
+    conflicto al volver a aprobarlo) y, si no, el mismo `version`, para que los
+    cambios ajenos de ese intervalo se sigan detectando.
+    """
+    nuevas = _preparar_lote(df)
+    conn = obtener_conexion()
+    with conn:
+        c = conn.cursor()
+        c.execute("BEGIN IMMEDIATE")
+        ultima = c.execute("SELECT COALESCE(MAX(Version), 0) FROM versiones_historico").fetchone()[0]
+        conflictos = _conflictos(c, nuevas, version)
+        if not conflictos.empty:
+            contar("bd.conflictos_aprobacion", len(conflictos))
+            raise ConflictoAprobacion(conflictos)
+        _escribir_asignaciones(c, nuevas)
+        if ultima <= version:
+            version = c.execute("SELECT COALESCE(MAX(Version), 0) FROM versiones_historico").fetchone()[0]
+    _resumen_modificado()
+    return version
+
+_SUMAR_EN_RESUMEN = f'''
+    ON CONFLICT ({RESUMEN_KEY}) DO UPDATE SET
+        Jornadas_Asignadas = Jornadas_Asignadas + excluded.Jornadas_Asignadas,
+        Horas_Asignadas = Horas_Asignadas + excluded.Horas_Asignadas
+'''
+
+# === Consultas del visor del resumen mensual ===
+# Filtros admitidos (argumento → columna); None no filtra y una lista vacía no devuelve nada
+FILTROS_RESUMEN = {"años": "Año", "meses": "Mes", "unidades": "Unidad", "turnos": "Turno", "jornadas": "Jornada"}
+ORDEN_RESUMEN = "Año, Mes, Unidad, Turno, Jornada, ID"
+FILAS_POR_PAGINA = 500
+
+_valores_resumen = CacheLRU(4)
+_version_resumen = 0
+
+def _resumen_modificado():
+    """Invalida las listas de valores memorizadas tras escribir en resumen_mensual"""
+    global _version_resumen
+    _version_resumen += 1
+
+def version_resumen():
+    """Identifica el contenido actual del resumen mensual (cambia con cada escritura)"""
+    return (str(DB_PATH), _generacion, _version_resumen)
+
+def _filtro_resumen(filtros):
+    condiciones, params = [], []
+    for argumento, valores in filtros.items():
+        if argumento not in FILTROS_RESUMEN:
+            raise ValueError(f"Filtro no soportado: {argumento}")
+        if valores is None:
+            continue
+        valores = [v.item() if hasattr(v, "item") else v for v in valores]
+        columna = FILTROS_RESUMEN[argumento]
+        condiciones.append(f"{columna} IN ({', '.join('?' * len(valores))})" if valores else "0")
+        params.extend(valores)
+    return (f"WHERE {' AND '.join(condiciones)}" if condiciones else ""), params
+
+def valores_resumen_mensual():
+    """Valores distintos de cada columna filtrable, memorizados hasta la próxima escritura"""
+    def calcular():
+        conn = obtener_conexion()
+        valores = {}
+        for argumento, columna in FILTROS_RESUMEN.items():
+            filas = conn.execute(f"SELECT DISTINCT {columna} FROM resumen_mensual ORDER BY 1").fetchall()
+            valores[argumento] = [f[0] for f in filas if f[0] is not None]
+        return valores
+    return _valores_resumen.obtener(version_resumen(), calcular)
+
+def contar_resumen_mensual(**filtros):
+    """Filas, jornadas y horas del resumen que cumplen los filtros, sin leerlas"""
+    where, params = _filtro_resumen(filtros)
+    filas, jornadas, horas = obtener_conexion().execute(f'''
+        SELECT COUNT(*), COALESCE(SUM(Jornadas_Asignadas), 0), COALESCE(SUM(Horas_Asignadas), 0)
+        FROM resumen_mensual {where}
+    ''', params).fetchone()
+    return {"filas": filas, "jornadas": jornadas, "horas": horas}
+
+@instrumentado("bd.obtener_resumen_mensual")
+def obtener_resumen_mensual(limite=None, desplazamiento=0, **filtros):
+    """Filas del resumen mensual filtradas en SQL (`años`, `meses`, `unidades`, `turnos`,
+    `jornadas`), en orden estable para poder paginar con `limite` y `desplazamiento`."""
+    where, params = _filtro_resumen(filtros)
+    pagina = ""
+    if limite is not None:
+        pagina = "LIMIT ? OFFSET ?"
+        params = params + [int(limite), int(desplazamiento)]
+    df = pd.read_sql_query(
+        f"SELECT * FROM resumen_mensual {where} ORDER BY {ORDEN_RESUMEN} {pagina}",
+        obtener_conexion(), params=params,
+    )
+    contar("bd.filas_leidas", len(df))
     return df
 
+def cargar_asignaciones():
+    return pd.read_sql_query("SELECT * FROM asignaciones", obtener_conexion())
+
+@instrumentado("bd.guardar_resumen_mensual")
 def guardar_resumen_mensual(df):
-    conn = sqlite3.connect(DB_PATH)
-    try:
-        # 1. Cargar datos existentes
-        existing = pd.read_sql_query("SELECT * FROM resumen_mensual", conn)
-        
-        # 2. Combinar con nuevos datos (sumando horas y jornadas)
-        if not existing.empty:
-            merged = pd.concat([existing, df]).groupby(
-                ["ID", "Unidad", "Turno", "Jornada", "Año", "Mes"]
-            ).agg({
-                "Horas_Asignadas": "sum",
-                "Jornadas_Asignadas": "sum"
-            }).reset_index()
-        else:
-            merged = df
-            
-        # 3. Reemplazar completamente la tabla
-        merged.to_sql("resumen_mensual", conn, if_exists="replace", index=False)
-        conn.commit()
-    except Exception as e:
-        conn.rollback()
-        raise e
-    finally:
-        conn.close()
+    """Reconcilia el resumen mensual de los meses que cubre `df` con la tabla asignaciones.
+
+    El resumen se mantiene por triggers al guardar asignaciones; esta función solo
+    recalcula los (Año, Mes) presentes en `df`, en una transacción, sin tocar el resto
+    del histórico. Es idempotente.
+    """
+    meses = sorted({(int(a), int(m)) for a, m in zip(df["Año"], df["Mes"])})
+    conn = obtener_conexion()
+    with conn:
+        c = conn.cursor()
+        for año, mes in meses:
+            desde = f"{año:04d}-{mes:02d}-01"
+            hasta = f"{año + mes // 12:04d}-{mes % 12 + 1:02d}-01"
+            c.execute("DELETE FROM resumen_mensual WHERE Año = ? AND Mes = ?", (año, mes))
+            _recalcular_resumen(c, desde, hasta)
+    _resumen_modificado()
 
 def reset_db():
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute("DROP TABLE IF EXISTS horas")
-    c.execute("DROP TABLE IF EXISTS asignaciones")
-    c.execute("DROP TABLE IF EXISTS resumen_mensual")
-    conn.commit()
-    conn.close()
+    conn = obtener_conexion()
+    with conn:
+        c = conn.cursor()
+        c.execute("DROP TABLE IF EXISTS horas")
+        c.execute("DROP TABLE IF EXISTS asignaciones")
+        c.execute("DROP TABLE IF EXISTS resumen_mensual")
+        c.execute("DROP TABLE IF EXISTS acumulados_anuales")
+        c.execute("DROP TABLE IF EXISTS versiones_historico")
+        c.execute("PRAGMA user_version = 0")
+    _resumen_modificado()
     init_db()
 
 def obtener_horas_acumuladas():
     """Obtiene el total de horas trabajadas por cada enfermera"""
-    conn = sqlite3.connect(DB_PATH)
     query = """
         SELECT 
             ID_Enfermera as ID, 
@@ -133,32 +655,164 @@ def obtener_horas_acumuladas():
         FROM asignaciones 
         GROUP BY ID_Enfermera
     """
-    df = pd.read_sql_query(query, conn)
-    conn.close()
+    df = pd.read_sql_query(query, obtener_conexion())
     return df  # Ejemplo: DataFrame con columnas [ID, Horas_Acumuladas]
 
-def obtener_horas_historicas(id_enfermera=None):
-    """Obtiene todas las asignaciones históricas"""
-    conn = sqlite3.connect(DB_PATH)
-    query = "SELECT * FROM asignaciones"
-    if id_enfermera:
-        query += f" WHERE ID_Enfermera = '{id_enfermera}'"
-    df = pd.read_sql_query(query, conn)
-    conn.close()
-    return df
+# Límite prudente de parámetros por sentencia (SQLite antiguos admiten 999)
+MAX_PARAMETROS = 900
+
+def _fecha_iso(valor):
+    return pd.Timestamp(valor).strftime("%Y-%m-%d")
+
+def _bloques_ids(ids):
+    """Parte `ids` (sin repetidos) en bloques de MAX_PARAMETROS; `[None]` si no se filtra"""
+    if ids is None:
+        return [None]
+    ids = list(dict.fromkeys(str(i) for i in ids))
+    return [ids[i:i + MAX_PARAMETROS] for i in range(0, len(ids), MAX_PARAMETROS)] or [[]]
+
+def _leer_asignaciones(query, desde=None, hasta=None, unidad=None, ids=None):
+    """Ejecuta `query` (con un hueco `{filtro}`) sobre asignaciones con filtros parametrizados.
 
-# Nueva función para obtener acumulados
-def obtener_acumulados_anuales():
-    conn = sqlite3.connect(DB_PATH)
+    `desde`/`hasta` acotan Fecha (ambos incluidos), `unidad` admite un nombre o una
+    lista y `ids` se parte en bloques de MAX_PARAMETROS cuyos resultados se concatenan.
+    """
+    condiciones, params = [], []
+    if desde is not None:
+        condiciones.append("Fecha >= ?")
+        params.append(_fecha_iso(desde))
+    if hasta is not None:
+        condiciones.append("Fecha <= ?")
+        params.append(_fecha_iso(hasta))
+    if unidad is not None:
+        unidades = [unidad] if isinstance(unidad, str) else list(unidad)
+        condiciones.append(f"Unidad IN ({', '.join('?' * len(unidades))})" if unidades else "0")
+        params.extend(unidades)
+
+    conn = obtener_conexion()
+    resultados = []
+    for bloque in _bloques_ids(ids):
+        extra, extra_params = [], []
+        if bloque is not None:
+            extra.append(f"ID_Enfermera IN ({', '.join('?' * len(bloque))})" if bloque else "0")
+            extra_params = bloque
+        where = " AND ".join(condiciones + extra)
+        resultados.append(pd.read_sql_query(
+            query.format(filtro=f"WHERE {where}" if where else ""), conn, params=params + extra_params
+        ))
+    contar("bd.filas_leidas", sum(len(r) for r in resultados))
+    return pd.concat(resultados, ignore_index=True) if len(resultados) > 1 else resultados[0]
+
+@instrumentado("bd.obtener_totales_enfermeras")
+def obtener_totales_enfermeras(ids=None, desde=None, hasta=None, unidad=None):
+    """Horas, jornadas y última fecha trabajada por enfermera, agregadas en SQL.
+
+    Admite los mismos filtros que `obtener_horas_historicas`. Las enfermeras sin
+    histórico en el rango no aparecen en el resultado. Para sembrar un plan, `hasta`
+    debe ser la víspera de su primer día: una fecha posterior bloquearía por
+    descanso todos los días anteriores a ella.
+    """
     query = '''
-        SELECT 
-            ID_Enfermera,
-            strftime('%Y', Fecha) as Año,
-            SUM(Horas) as Horas_Acumuladas,
-            COUNT(*) as Jornadas_Acumuladas
+        SELECT
+            ID_Enfermera AS ID,
+            SUM(Horas) AS Horas_Acumuladas,
+            COUNT(*) AS Jornadas_Acumuladas,
+            MAX(Fecha) AS Ultima_Fecha
         FROM asignaciones
-        GROUP BY ID_Enfermera, strftime('%Y', Fecha)
+        {filtro}
+        GROUP BY ID_Enfermera
     '''
-    df = pd.read_sql_query(query, conn)
-    conn.close()
-    return df
+    return _leer_asignaciones(query, desde=desde, hasta=hasta, unidad=unidad, ids=ids)
+
+@instrumentado("bd.obtener_horas_historicas")
+def obtener_horas_historicas(id_enfermera=None, desde=None, hasta=None, unidad=None, ids=None):
+    """Obtiene las asignaciones históricas, filtradas por enfermera(s), rango de fechas y unidad"""
+    if id_enfermera:
+        ids = [id_enfermera] + list(ids or [])
+    return _leer_asignaciones("SELECT * FROM asignaciones {filtro}",
+                              desde=desde, hasta=hasta, unidad=unidad, ids=ids)
+
+def obtener_acumulados_anuales(ids=None, año=None):
+    """Horas y jornadas por enfermera y año, leídas de la tabla acumulados_anuales"""
+    condiciones, params = [], []
+    if año is not None:
+        condiciones.append("Año = ?")
+        params.append(int(año))
+    resultados = []
+    for bloque in _bloques_ids(ids):
+        extra = []
+        if bloque is not None:
+            extra.append(f"ID IN ({', '.join('?' * len(bloque))})" if bloque else "0")
+        where = " AND ".join(condiciones + extra)
+        resultados.append(pd.read_sql_query(f'''
+            SELECT
+                ID AS ID_Enfermera,
+                Año,
+                SUM(Horas_Asignadas) AS Horas_Acumuladas,
+                SUM(Jornadas_Asignadas) AS Jornadas_Acumuladas
+            FROM acumulados_anuales
+            {f"WHERE {where}" if where else ""}
+            GROUP BY ID, Año
+        ''', obtener_conexion(), params=params + (bloque or [])))
+    contar("bd.filas_leidas", sum(len(r) for r in resultados))
+    return pd.concat(resultados, ignore_index=True) if len(resultados) > 1 else resultados[0]
+
+@instrumentado("bd.obtener_historico_anual")
+def obtener_historico_anual(ids, año, antes_de=None):
+    """Histórico con el que se siembran los límites anuales de una asignación en `año`.
+
+    Devuelve `ID`, `Horas_Acumuladas` y `Jornadas_Acumuladas` del año (todas las
+    jornadas de contrato sumadas) y `Ultima_Fecha` trabajada, con la misma forma
+    que `obtener_totales_enfermeras`. Cada enfermera se resuelve con búsquedas por
+    índice en acumulados_anuales y asignaciones, sin agregar el histórico completo.
+    Las enfermeras sin asignaciones en `año` ni en el anterior no aparecen.
+
+    Con `antes_de` (el primer día del plan), `Ultima_Fecha` es la última anterior a
+    ese día y `Racha` cuenta los días seguidos trabajados justo hasta la víspera
+    (0 si la víspera no se trabajó). Sin él no hay `Racha` y `Ultima_Fecha` no se acota.
+    """
+    año = int(año)
+    antes = _fecha_iso(antes_de) if antes_de is not None else None
+    resultados = []
+    for bloque in _bloques_ids(ids):
+        filtro = "1" if bloque is None else f"ID IN ({', '.join('?' * len(bloque))})" if bloque else "0"
+        df = pd.read_sql_query(f'''
+            SELECT
+                ID,
+                SUM(CASE WHEN Año = ? THEN Horas_Asignadas ELSE 0 END) AS Horas_Acumuladas,
+                SUM(CASE WHEN Año = ? THEN Jornadas_Asignadas ELSE 0 END) AS Jornadas_Acumuladas,
+                (SELECT MAX(Fecha) FROM asignaciones
+                 WHERE ID_Enfermera = acumulados_anuales.ID {"AND Fecha < ?" if antes else ""}) AS Ultima_Fecha
+            FROM acumulados_anuales
+            WHERE {filtro} AND Año BETWEEN ? AND ?
+            GROUP BY ID
+        ''', obtener_conexion(), params=[año, año] + ([antes] if antes else []) + (bloque or []) + [año - 1, año])
+        if antes:
+            df["Racha"] = _rachas_hasta(df["ID"], antes).reindex(df["ID"]).fillna(0).astype(int).to_numpy()
+        resultados.append(df)
+    contar("bd.filas_leidas", sum(len(r) for r in resultados))
+    return pd.concat(resultados, ignore_index=True) if len(resultados) > 1 else resultados[0]
+
+def _rachas_hasta(ids, antes):
+    """Días seguidos trabajados por cada enfermera hasta la víspera de `antes` (ISO).
+
+    Solo se leen, por el índice (ID_Enfermera, Fecha), los últimos
+    MAX_DIAS_CONSECUTIVOS días: una racha más larga ya no cambia ninguna regla.
+    """
+    ids = list(ids)
+    if not ids:
+        return pd.Series(dtype=int)
+    desde = _fecha_iso(pd.Timestamp(antes) - timedelta(days=MAX_DIAS_CONSECUTIVOS))
+    fechas = pd.read_sql_query(f'''
+        SELECT DISTINCT ID_Enfermera AS ID, Fecha FROM asignaciones
+        WHERE ID_Enfermera IN ({', '.join('?' * len(ids))}) AND Fecha >= ? AND Fecha < ?
+    ''', obtener_conexion(), params=ids + [desde, antes])
+    # Días desde cada fecha hasta `antes`: la racha es el primer hueco en 1, 2, 3...
+    distancia = (pd.Timestamp(antes) - pd.to_datetime(fechas["Fecha"])).dt.days
+    rachas = {}
+    for id_, dist in distancia.groupby(fechas["ID"]):
+        presentes, racha = set(dist), 0
+        while racha + 1 in presentes:
+            racha += 1
+        rachas[id_] = racha
+    return pd.Series(rachas, dtype=int)
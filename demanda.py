@@ -0,0 +1,98 @@
+"""Generación de tablas de demanda sin dependencias de Streamlit.
+
+La demanda se construye por difusión (fechas × unidades × turnos) sobre arrays de
+NumPy a partir de una plantilla semanal por unidad, por lo que horizontes de
+varios años y todas las unidades se generan en milisegundos.
+"""
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+from motor_asignacion import COLUMNAS_DEMANDA
+
+DIAS_SEMANA = ["Lunes", "Martes", "Miércoles", "Jueves", "Viernes", "Sábado", "Domingo"]
+TURNOS = ["Mañana", "Tarde", "Noche"]
+
+
+def matriz_semanal(plantilla):
+    """Convierte una plantilla semanal en una matriz 7 × 3 (día de la semana × turno).
+
+    Admite el formato de los formularios (`{dia: {turno: n}}`) o cualquier array 7 × 3.
+    """
+    if isinstance(plantilla, dict):
+        return np.array([[plantilla[dia].get(t, 0) for t in TURNOS] for dia in DIAS_SEMANA], dtype=np.int64)
+    matriz = np.asarray(plantilla, dtype=np.int64)
+    if matriz.shape != (len(DIAS_SEMANA), len(TURNOS)):
+        raise ValueError(f"La plantilla semanal debe ser {len(DIAS_SEMANA)}×{len(TURNOS)}, no {matriz.shape}")
+    return matriz
+
+
+def _es_plantilla_por_unidad(plantilla):
+    return isinstance(plantilla, dict) and not set(plantilla) <= set(DIAS_SEMANA)
+
+
+def generar_demanda(fecha_inicio, fecha_fin, unidades, plantilla_semanal, overrides=None):
+    """Genera la demanda de `unidades` entre `fecha_inicio` y `fecha_fin` (ambas incluidas).
+
+    `plantilla_semanal` es una única plantilla para todas las unidades o un
+    diccionario unidad -> plantilla (ver `matriz_semanal`).
+
+    `overrides` es un DataFrame opcional con `Fecha` y, si se quiere acotar, `Unidad`
+    y `Turno` (vacíos = todas). Cada fila fija `Personal_Requerido` o multiplica la
+    demanda por `Factor`; sirve para festivos o picos estacionales. Las filas se
+    aplican en orden.
+    """
+    unidades = [unidades] if isinstance(unidades, str) else list(unidades)
+    if _es_plantilla_por_unidad(plantilla_semanal):
+        faltan = [u for u in unidades if u not in plantilla_semanal]
+        if faltan:
+            raise ValueError(f"Faltan plantillas semanales para: {faltan}")
+        semanal = np.stack([matriz_semanal(plantilla_semanal[u]) for u in unidades])
+    else:
+        semanal = np.broadcast_to(matriz_semanal(plantilla_semanal), (len(unidades), 7, len(TURNOS)))
+
+    fechas = pd.date_range(pd.Timestamp(fecha_inicio), pd.Timestamp(fecha_fin), freq="D")
+    # (unidad, día, turno) -> (día, unidad, turno): mismo orden que la generación fila a fila
+    valores = semanal[:, fechas.weekday, :].transpose(1, 0, 2).astype(np.float64)
+
+    if overrides is not None and len(overrides):
+        _aplicar_overrides(valores, fechas, unidades, overrides)
+
+    n_dias, n_unidades, n_turnos = valores.shape
+    return pd.DataFrame({
+        "Fecha": np.repeat(fechas.strftime("%Y-%m-%d").to_numpy(dtype=object), n_unidades * n_turnos),
+        "Unidad": np.tile(np.repeat(np.array(unidades, dtype=object), n_turnos), n_dias),
+        "Turno": np.tile(np.array(TURNOS, dtype=object), n_dias * n_unidades),
+        "Personal_Requerido": np.rint(valores.ravel()).astype(np.int64),
+    }, columns=COLUMNAS_DEMANDA)
+
+
+def _aplicar_overrides(valores, fechas, unidades, overrides):
+    """Aplica in situ sobre `valores` (día × unidad × turno) las filas de `overrides`"""
+    if not len(fechas):
+        return
+    dias = (pd.to_datetime(overrides["Fecha"]) - fechas[0]).dt.days.to_numpy()
+    idx_unidad = {u: i for i, u in enumerate(unidades)}
+    idx_turno = {t: i for i, t in enumerate(TURNOS)}
+
+    def columna(nombre):
+        return overrides[nombre].tolist() if nombre in overrides else [None] * len(overrides)
+
+    for dia, unidad, turno, fijo, factor in zip(dias, columna("Unidad"), columna("Turno"),
+                                                columna("Personal_Requerido"), columna("Factor")):
+        if not 0 <= dia < len(fechas):
+            continue
+        u = slice(None) if pd.isna(unidad) else idx_unidad.get(unidad)
+        t = slice(None) if pd.isna(turno) else idx_turno.get(turno)
+        if u is None or t is None:
+            continue
+        if not pd.isna(fijo):
+            valores[dia, u, t] = fijo
+        elif not pd.isna(factor):
+            valores[dia, u, t] *= factor
+
+
+def demanda_anual(año, unidades, plantilla_semanal, overrides=None):
+    """Atajo para generar la demanda del año natural `año`"""
+    return generar_demanda(date(año, 1, 1), date(año, 12, 31), unidades, plantilla_semanal, overrides)
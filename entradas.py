@@ -0,0 +1,193 @@
+"""Lectura de los archivos de entrada (plantilla y demanda) con caché por contenido.
+
+Streamlit vuelve a ejecutar la página en cada interacción y los uploaders devuelven
+los mismos bytes una y otra vez. Aquí cada archivo se identifica por el hash de su
+contenido y el resultado ya normalizado (incluida la `Plantilla` con ausencias
+compiladas y límites por enfermera) se guarda en una caché LRU acotada.
+
+Se aceptan Excel, CSV, Parquet y Feather (estos dos requieren pyarrow). El formato
+se detecta por el contenido y todos pasan por el mismo esquema: columnas
+comprobadas, identificadores como texto y unidades, turnos y jornadas categóricos.
+"""
+import hashlib
+import importlib.util
+import threading
+from collections import OrderedDict
+from io import BytesIO
+from pathlib import Path
+
+import pandas as pd
+
+from instrumentacion import contar, instrumentado
+from motor_asignacion import cargar_plantilla
+
+MAX_ENTRADAS_CACHE = 8
+
+# Extensiones admitidas por los uploaders (Parquet y Feather solo si está pyarrow)
+TIPOS_ENTRADA = ["xlsx", "csv"] + (["parquet", "feather"] if importlib.util.find_spec("pyarrow") else [])
+
+# Columna -> tipo de cada tabla de entrada; las columnas de texto se limpian de espacios
+ESQUEMA_PLANTILLA = {
+    "ID": "texto",
+    "Unidad_Asignada": "categoria",
+    "Jornada": "categoria",
+    "Turno_Contrato": "categoria",
+    "Fechas_No_Disponibilidad": "libre",
+}
+ESQUEMA_DEMANDA = {
+    "Fecha": "fecha",
+    "Unidad": "categoria",
+    "Turno": "categoria",
+    "Personal_Requerido": "entero",
+}
+
+
+class CacheLRU:
+    """Diccionario acotado que descarta la entrada usada hace más tiempo"""
+
+    def __init__(self, max_entradas):
+        self.max_entradas = max_entradas
+        self._datos = OrderedDict()
+        self._lock = threading.Lock()
+
+    def obtener(self, clave, calcular):
+        """Devuelve el valor de `clave`, calculándolo con `calcular()` si no está en caché"""
+        with self._lock:
+            if clave in self._datos:
+                self._datos.move_to_end(clave)
+                contar("cache.aciertos")
+                return self._datos[clave]
+        contar("cache.fallos")
+        valor = calcular()
+        with self._lock:
+            self._datos[clave] = valor
+            self._datos.move_to_end(clave)
+            while len(self._datos) > self.max_entradas:
+                self._datos.popitem(last=False)
+        return valor
+
+    def limpiar(self):
+        with self._lock:
+            self._datos.clear()
+
+    def __contains__(self, clave):
+        with self._lock:
+            return clave in self._datos
+
+    def __len__(self):
+        return len(self._datos)
+
+
+_cache = CacheLRU(MAX_ENTRADAS_CACHE)
+
+
+def _leer_bytes(archivo):
+    """Bytes de un UploadedFile de Streamlit, un objeto tipo archivo, bytes o una ruta"""
+    if isinstance(archivo, (bytes, bytearray)):
+        return bytes(archivo)
+    if hasattr(archivo, "getvalue"):
+        return archivo.getvalue()
+    if hasattr(archivo, "read"):
+        return archivo.read()
+    return Path(archivo).read_bytes()
+
+
+def huella(datos):
+    return hashlib.blake2b(datos, digest_size=16).hexdigest()
+
+
+def detectar_formato(datos):
+    """Formato del archivo según sus primeros bytes: 'xlsx', 'parquet', 'feather' o 'csv'"""
+    if datos[:4] == b"PK\x03\x04":
+        return "xlsx"
+    if datos[:4] == b"PAR1":
+        return "parquet"
+    if datos[:6] == b"ARROW1":
+        return "feather"
+    return "csv"
+
+
+@instrumentado("entradas.leer_archivo")
+def _leer_tabla(datos):
+    formato = detectar_formato(datos)
+    if formato in ("parquet", "feather") and importlib.util.find_spec("pyarrow") is None:
+        raise ValueError(f"Para leer archivos {formato} hace falta instalar pyarrow")
+    if formato == "xlsx":
+        df = pd.read_excel(BytesIO(datos))
+    elif formato == "parquet":
+        df = pd.read_parquet(BytesIO(datos))
+    elif formato == "feather":
+        df = pd.read_feather(BytesIO(datos))
+    else:
+        df = pd.read_csv(BytesIO(datos), encoding="utf-8-sig")
+    df.columns = df.columns.astype(str).str.strip()
+    return df
+
+
+def aplicar_esquema(df, esquema):
+    """Comprueba las columnas de `esquema` y convierte cada una a su tipo.
+
+    Las columnas ausentes de tipo 'libre' se añaden vacías; el resto deben existir.
+    Se descartan las filas completamente vacías (habituales al final de un Excel) y
+    las columnas que no están en el esquema se conservan tal cual. Un entero vacío
+    cuenta como 0.
+    """
+    df = df.dropna(how="all").reset_index(drop=True)
+    df.columns = df.columns.astype(str).str.strip()
+    for col, tipo in esquema.items():
+        if tipo == "libre" and col not in df.columns:
+            df[col] = None
+    missing = [col for col in esquema if col not in df.columns]
+    if missing:
+        raise ValueError(f"Faltan columnas: {missing}")
+
+    for col, tipo in esquema.items():
+        if tipo == "texto":
+            df[col] = df[col].astype(str).str.strip()
+        elif tipo == "categoria":
+            df[col] = df[col].astype(str).str.strip().astype("category")
+        elif tipo == "fecha":
+            df[col] = pd.to_datetime(df[col], errors="coerce")
+            if df[col].isna().any():
+                raise ValueError(f"Fechas no válidas en la columna {col}")
+        elif tipo == "entero":
+            valores = pd.to_numeric(df[col], errors="coerce")
+            if (valores.isna() & df[col].notna()).any():
+                raise ValueError(f"Valores no numéricos en la columna {col}")
+            df[col] = valores.fillna(0).astype("int64")
+    return df
+
+
+def _parsear_plantilla(datos):
+    staff = aplicar_esquema(_leer_tabla(datos), ESQUEMA_PLANTILLA)
+    return staff, cargar_plantilla(staff)
+
+
+def _parsear_demanda(datos):
+    return aplicar_esquema(_leer_tabla(datos), ESQUEMA_DEMANDA)
+
+
+@instrumentado("entradas.leer_plantilla")
+def leer_plantilla(archivo):
+    """Devuelve `(staff, plantilla)`: el DataFrame leído y su `Plantilla` normalizada.
+
+    `archivo` puede ser Excel, CSV, Parquet o Feather. Lanza ValueError si faltan
+    columnas o hay turnos no reconocidos.
+    """
+    datos = _leer_bytes(archivo)
+    staff, plantilla = _cache.obtener(("plantilla", huella(datos)), lambda: _parsear_plantilla(datos))
+    return staff.copy(deep=False), plantilla
+
+
+@instrumentado("entradas.leer_demanda")
+def leer_demanda(archivo):
+    """Devuelve el DataFrame de demanda validado y tipado (Excel, CSV, Parquet o Feather).
+
+    Lanza ValueError si faltan columnas o hay fechas o cantidades no válidas.
+    """
+    datos = _leer_bytes(archivo)
+    return _cache.obtener(("demanda", huella(datos)), lambda: _parsear_demanda(datos)).copy(deep=False)
+
+
+def limpiar_cache():
+    _cache.limpiar()
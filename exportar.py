@@ -0,0 +1,115 @@
+"""Exportación de DataFrames para las descargas de la aplicación.
+
+- Excel se escribe con openpyxl en modo `write_only` (fila a fila, sin mantener el
+  libro completo en memoria); también hay CSV y, si pyarrow está instalado, Parquet.
+- Los bytes se generan solo cuando se piden y se memorizan por (versión, nombre,
+  formato), de forma que los reruns de Streamlit no vuelven a generarlos.
+"""
+import importlib.util
+from io import BytesIO
+
+import pandas as pd
+
+from entradas import CacheLRU
+from instrumentacion import tramo
+
+FORMATOS = {
+    "xlsx": ("Excel", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+    "csv": ("CSV", "text/csv"),
+    "parquet": ("Parquet", "application/vnd.apache.parquet"),
+}
+MAX_EXPORTACIONES_CACHE = 16
+
+_cache = CacheLRU(MAX_EXPORTACIONES_CACHE)
+
+
+def formatos_disponibles():
+    """Formatos utilizables en este entorno (Parquet requiere pyarrow)"""
+    return [f for f in FORMATOS if f != "parquet" or importlib.util.find_spec("pyarrow")]
+
+
+def _valor_celda(valor):
+    if valor is None or (not isinstance(valor, str) and pd.isna(valor)):
+        return None
+    if isinstance(valor, pd.Timestamp):
+        return valor.to_pydatetime()
+    return valor.item() if hasattr(valor, "item") else valor
+
+
+def excel_bytes(df, sheet_name="Sheet1"):
+    """Excel en modo streaming: las filas se escriben según se recorren"""
+    from openpyxl import Workbook
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(title=sheet_name)
+    ws.append([str(c) for c in df.columns])
+    for fila in zip(*(df[c].tolist() for c in df.columns)):
+        ws.append([_valor_celda(v) for v in fila])
+    output = BytesIO()
+    wb.save(output)
+    return output.getvalue()
+
+
+def csv_bytes(df):
+    # BOM para que Excel abra correctamente acentos y eñes
+    return df.to_csv(index=False).encode("utf-8-sig")
+
+
+def parquet_bytes(df):
+    output = BytesIO()
+    df.to_parquet(output, index=False)
+    return output.getvalue()
+
+
+def exportar(df, formato="xlsx", sheet_name="Sheet1"):
+    """Bytes de `df` en `formato` ('xlsx', 'csv' o 'parquet'); vacío si no hay datos"""
+    if df is None or df.empty:
+        return b''
+    if formato not in FORMATOS:
+        raise ValueError(f"Formato no soportado: {formato}")
+    with tramo(f"exportar.{formato}"):
+        if formato == "xlsx":
+            return excel_bytes(df, sheet_name)
+        if formato == "csv":
+            return csv_bytes(df)
+        return parquet_bytes(df)
+
+
+def version_de(df):
+    """Huella del contenido de `df`, para memorizar exportaciones sin versión explícita"""
+    if df is None:
+        return None
+    return (len(df), tuple(df.columns), int(pd.util.hash_pandas_object(df, index=False).sum()))
+
+
+def exportar_memorizado(df, nombre, formato="xlsx", version=None, sheet_name="Sheet1"):
+    """Como `exportar`, pero reutiliza los bytes ya generados para la misma versión.
+
+    Con una `version` explícita, `df` puede ser una función que devuelva el
+    DataFrame: solo se llama si los bytes no están ya en caché. La caché es común a
+    todas las sesiones, así que `version` debe identificar el contenido de forma
+    única (un uuid por resultado, una versión de la base de datos...), no un
+    contador de la sesión.
+    """
+    clave = (version if version is not None else version_de(df), nombre, formato, sheet_name)
+    return _cache.obtener(clave, lambda: exportar(df() if callable(df) else df, formato, sheet_name))
+
+
+def boton_descarga(label, df, nombre, formato="xlsx", version=None, sheet_name="Sheet1", key=None):
+    """Botón de descarga de Streamlit que no genera el archivo hasta que se pide.
+
+    La primera vez muestra un botón para preparar el archivo; una vez generado
+    (o si ya estaba en caché para esta versión) muestra directamente la descarga.
+    Como en `exportar_memorizado`, `df` puede ser una función si se da `version`.
+    """
+    import streamlit as st
+
+    clave = (version if version is not None else version_de(df), nombre, formato, sheet_name)
+    key = key or f"descarga_{nombre}_{formato}"
+    file_name = f"{nombre}.{formato}"
+    mime = FORMATOS[formato][1]
+    if clave not in _cache and not st.button(f"{label} · preparar {FORMATOS[formato][0]}",
+                                                    key=f"{key}_preparar"):
+        return
+    data = exportar_memorizado(df, nombre, formato, version, sheet_name)
+    st.download_button(label, data=data, file_name=file_name, mime=mime, key=key)
@@ -1,24 +1,27 @@
 import streamlit as st
-import pandas as pd
-from io import BytesIO
-from datetime import datetime, timedelta
+from datetime import date
+from demanda import DIAS_SEMANA, TURNOS, generar_demanda
+from exportar import FORMATOS, exportar
 
 def generar_demanda_interactiva():
     st.markdown("""
     ### 🗓️ Generador interactivo de demanda de turnos
-    Este módulo permite crear automáticamente la demanda de turnos para una unidad durante todo un año.
+    Este módulo permite crear automáticamente la demanda de turnos para una o varias unidades en el periodo que elijas.
     
-    1. Selecciona la unidad que quieres planificar.
+    1. Selecciona las unidades y el rango de fechas que quieres planificar.
     2. Define cuántas enfermeras necesitas por turno para cada día de la semana.
-    3. Descarga el Excel con los 365 días del año para usarlo en la asignación.
+    3. Descarga el Excel con la demanda para usarlo en la asignación.
     """)
 
-    unidad_seleccionada = st.selectbox("Selecciona la unidad hospitalaria", [
+    unidades_seleccionadas = st.multiselect("Selecciona las unidades hospitalarias", [
         "Medicina Interna", "UCI", "Urgencias", "Oncología", "Quirófano"
-    ])
+    ], default=["Medicina Interna"])
+    col1, col2 = st.columns(2)
+    fecha_inicio = col1.date_input("Fecha de inicio", value=date(2025, 1, 1))
+    fecha_fin = col2.date_input("Fecha de fin", value=date(2025, 12, 31))
 
-    dias_semana = ["Lunes", "Martes", "Miércoles", "Jueves", "Viernes", "Sábado", "Domingo"]
-    turnos = ["Mañana", "Tarde", "Noche"]
+    dias_semana = DIAS_SEMANA
+    turnos = TURNOS
 
     st.markdown("### Configuración de turnos por día")
     demanda_por_dia = {}
@@ -32,35 +35,19 @@ def generar_demanda_interactiva():
                 label=f"{turno}", min_value=0, max_value=20, value=3, key=f"{dia}_{turno}"
             )
 
-    if st.button("📄 Generar demanda para 2025"):
-        start_date = datetime(2025, 1, 1)
-        fechas = [start_date + timedelta(days=i) for i in range(365)]
+    if not unidades_seleccionadas or fecha_fin < fecha_inicio:
+        st.warning("⚠️ Selecciona al menos una unidad y un rango de fechas válido.")
+        return
 
-        demanda = []
-        for fecha in fechas:
-            dia_castellano = dias_semana[fecha.weekday()]
-            for turno in turnos:
-                demanda.append({
-                    "Fecha": fecha.strftime("%Y-%m-%d"),
-                    "Unidad": unidad_seleccionada,
-                    "Turno": turno,
-                    "Personal_Requerido": demanda_por_dia[dia_castellano][turno]
-                })
-
-        df_demanda = pd.DataFrame(demanda)
-
-        def to_excel_bytes(df):
-            output = BytesIO()
-            with pd.ExcelWriter(output, engine="openpyxl") as writer:
-                df.to_excel(writer, index=False)
-            return output.getvalue()
+    if st.button("📄 Generar demanda"):
+        df_demanda = generar_demanda(fecha_inicio, fecha_fin, unidades_seleccionadas, demanda_por_dia)
 
         st.success("✅ Demanda generada correctamente.")
         st.dataframe(df_demanda.head(10))
 
         st.download_button(
             label="⬇️ Descargar Excel de demanda",
-            data=to_excel_bytes(df_demanda),
-            file_name=f"Demanda_{unidad_seleccionada}_2025.xlsx",
-            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+            data=exportar(df_demanda),
+            file_name=f"Demanda_{'_'.join(unidades_seleccionadas)}_{fecha_inicio:%Y%m%d}_{fecha_fin:%Y%m%d}.xlsx",
+            mime=FORMATOS["xlsx"][1]
         )
@@ -0,0 +1,128 @@
+"""Medición ligera de tiempos y contadores del flujo de asignación.
+
+Solo se mide dentro de un bloque `with medir():`. Fuera de él, `tramo` y
+`contar` se reducen a leer una ContextVar, y los bucles calientes obtienen la
+medición activa una vez con `activa()` y no cuentan nada si es None.
+
+    with medir() as medicion:
+        with tramo("motor.asignacion"):
+            ...
+        contar("bd.filas_escritas", 1000)
+    medicion.a_json()
+
+La medición es por contexto (hilo de Streamlit), así que sesiones simultáneas no
+se mezclan. Lo que se ejecuta en procesos hijos (`procesos > 1`) no se cuenta.
+"""
+import functools
+import json
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+
+import pandas as pd
+
+_actual = ContextVar("medicion", default=None)
+
+
+class Medicion:
+    """Tramos cronometrados y contadores acumulados de una ejecución"""
+
+    def __init__(self, nombre="medicion"):
+        self.nombre = nombre
+        self.inicio = datetime.now()
+        self.tramos = []  # (nombre, nivel, inicio relativo, duración)
+        self.contadores = defaultdict(int)
+        self._t0 = time.perf_counter()
+        self._nivel = 0
+
+    def contar(self, nombre, n=1):
+        self.contadores[nombre] += int(n)
+
+    @contextmanager
+    def tramo(self, nombre):
+        t = time.perf_counter()
+        nivel = self._nivel
+        self._nivel += 1
+        try:
+            yield
+        finally:
+            self._nivel = nivel
+            self.tramos.append((nombre, nivel, t - self._t0, time.perf_counter() - t))
+
+    def tabla_tramos(self):
+        """Tramos en orden de inicio, con el nombre sangrado según su anidamiento"""
+        filas = sorted(self.tramos, key=lambda t: t[2])
+        return pd.DataFrame(
+            [("  " * nivel + nombre, round(ini * 1000, 2), round(dur * 1000, 2)) for nombre, nivel, ini, dur in filas],
+            columns=["Tramo", "Inicio_ms", "Duracion_ms"],
+        )
+
+    def tabla_contadores(self):
+        return pd.DataFrame(sorted(self.contadores.items()), columns=["Contador", "Valor"])
+
+    def a_dict(self):
+        return {
+            "nombre": self.nombre,
+            "inicio": self.inicio.isoformat(timespec="seconds"),
+            "tramos": [
+                {"nombre": nombre, "nivel": nivel, "inicio_ms": round(ini * 1000, 3), "duracion_ms": round(dur * 1000, 3)}
+                for nombre, nivel, ini, dur in sorted(self.tramos, key=lambda t: t[2])
+            ],
+            "contadores": dict(sorted(self.contadores.items())),
+        }
+
+    def a_json(self):
+        return json.dumps(self.a_dict(), indent=2, ensure_ascii=False)
+
+
+def activa():
+    """Medición en curso en este contexto, o None"""
+    return _actual.get()
+
+
+@contextmanager
+def medir(nombre="medicion", activo=True):
+    """Activa una `Medicion` durante el bloque; con `activo=False` no mide y devuelve None"""
+    if not activo:
+        yield None
+        return
+    medicion = Medicion(nombre)
+    token = _actual.set(medicion)
+    try:
+        with medicion.tramo(nombre):
+            yield medicion
+    finally:
+        _actual.reset(token)
+
+
+@contextmanager
+def tramo(nombre):
+    """Cronometra el bloque si hay una medición activa"""
+    medicion = _actual.get()
+    if medicion is None:
+        yield
+        return
+    with medicion.tramo(nombre):
+        yield
+
+
+def contar(nombre, n=1):
+    medicion = _actual.get()
+    if medicion is not None:
+        medicion.contar(nombre, n)
+
+
+def instrumentado(nombre):
+    """Decorador: cronometra cada llamada a la función como el tramo `nombre`"""
+    def decorador(funcion):
+        @functools.wraps(funcion)
+        def envoltura(*args, **kwargs):
+            medicion = _actual.get()
+            if medicion is None:
+                return funcion(*args, **kwargs)
+            with medicion.tramo(nombre):
+                return funcion(*args, **kwargs)
+        return envoltura
+    return decorador
@@ -0,0 +1,516 @@
+"""Motor de asignación de turnos sin dependencias de Streamlit.
+
+Mantiene el estado de cada enfermera en arrays indexados por posición
+(horas, jornadas, último día trabajado, racha de días consecutivos y fin del
+último turno) en lugar de recalcularlo sobre DataFrames en cada fila de
+demanda, de modo que todas las reglas se comprueban en tiempo constante.
+
+Como las enfermeras solo cubren turnos de su `Unidad_Asignada`, cada unidad es
+un problema independiente: con `procesos > 1` las unidades se resuelven en
+paralelo y el resultado se fusiona en el mismo orden que la ejecución en serie.
+"""
+import ast
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass
+from datetime import date
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+from instrumentacion import activa, tramo
+
+SHIFT_HOURS = {"Mañana": 7.5, "Tarde": 7.5, "Noche": 10}
+SHIFT_START_HOUR = {"Mañana": 8, "Tarde": 15, "Noche": 22}
+BASE_MAX_HOURS = {"Mañana": 1642.5, "Tarde": 1642.5, "Noche": 1470}
+BASE_MAX_JORNADAS = {"Mañana": 219, "Tarde": 219, "Noche": 147}
+FACTOR_PARCIAL = 0.8
+MAX_DIAS_CONSECUTIVOS = 8
+MIN_DESCANSO_HORAS = 12
+# Procesos para resolver unidades en paralelo; 1 = en serie, sin pool
+PROCESOS_POR_DEFECTO = 1
+MAX_PROCESOS = os.cpu_count() or 1
+
+COLUMNAS_PLANTILLA = ["ID", "Unidad_Asignada", "Jornada", "Turno_Contrato", "Fechas_No_Disponibilidad"]
+COLUMNAS_DEMANDA = ["Fecha", "Unidad", "Turno", "Personal_Requerido"]
+COLUMNAS_ASIGNACION = ["Fecha", "Unidad", "Turno", "ID_Enfermera", "Jornada", "Horas"]
+COLUMNAS_SIN_CUBRIR = ["Fecha", "Unidad", "Turno", "Faltan"]
+# Columnas de texto repetido de las asignaciones: se guardan como categóricas
+# (códigos enteros + diccionario) y las etiquetas solo se generan al mostrar o exportar
+COLUMNAS_CATEGORICAS = ["Fecha", "Unidad", "Turno", "ID_Enfermera", "Jornada"]
+# Reglas en el orden en que se comprueban; cada descarte se atribuye a la primera que falla
+REGLAS = ["ausencia", "ya_asignada", "max_jornadas", "max_horas", "dias_consecutivos", "descanso"]
+# Columnas de diagnóstico de df_uncov: tamaño del pool y descartes por regla
+COLUMNAS_MOTIVOS = ["Candidatas"] + [f"Rechazo_{regla}" for regla in REGLAS]
+
+# Ordinal usado como "nunca ha trabajado": lejos de cualquier fecha real
+SIN_DIA = -(10 ** 9)
+SIN_FIN = float(SIN_DIA) * 24
+
+
+def parse_dates(cell):
+    """Convierte la celda de no disponibilidad en una lista de fechas 'YYYY-MM-DD'"""
+    if isinstance(cell, (list, tuple, np.ndarray)):
+        # Listas nativas de Parquet/Feather
+        return [str(d).strip() for d in cell]
+    if pd.isna(cell):
+        return []
+    try:
+        return [str(d).strip() for d in ast.literal_eval(str(cell))]
+    except Exception:
+        return [d.strip() for d in str(cell).split(',') if d.strip()]
+
+
+def _normalizar_fechas(serie):
+    return pd.to_datetime(serie).dt.strftime("%Y-%m-%d")
+
+
+def _comprobar_columnas(df, requeridas):
+    missing = [col for col in requeridas if col not in df.columns]
+    if missing:
+        raise ValueError(f"Faltan columnas: {missing}")
+
+
+# Ordinal del 1970-01-01, para pasar datetime64[D] a ordinales de `date`
+_ORDINAL_EPOCH = date(1970, 1, 1).toordinal()
+
+
+@dataclass
+class MapaAusencias:
+    """Matriz booleana día × enfermera con las fechas de no disponibilidad.
+
+    Se guarda por filas de día para que la consulta de una fecha sea una lectura
+    contigua de todas las enfermeras. Las fechas fuera del rango no tienen ausencias.
+    """
+    origen: int
+    matriz: np.ndarray
+
+    @classmethod
+    def compilar(cls, listas):
+        n = len(listas)
+        enfermera = np.repeat(np.arange(n), [len(lst) for lst in listas])
+        fechas = pd.to_datetime(pd.Series([f for lst in listas for f in lst], dtype=object),
+                                errors="coerce")
+        validas = fechas.notna().to_numpy()
+        if not validas.any():
+            return cls(origen=0, matriz=np.zeros((0, n), dtype=bool))
+        dias = fechas[validas].to_numpy().astype("datetime64[D]").astype(np.int64) + _ORDINAL_EPOCH
+        origen = int(dias.min())
+        matriz = np.zeros((int(dias.max()) - origen + 1, n), dtype=bool)
+        matriz[dias - origen, enfermera[validas]] = True
+        return cls(origen=origen, matriz=matriz)
+
+    def ausentes(self, dia, pos):
+        """Máscara de las posiciones `pos` que no están disponibles el día ordinal `dia`"""
+        fila = dia - self.origen
+        if 0 <= fila < len(self.matriz):
+            return self.matriz[fila, pos]
+        return np.zeros(len(pos), dtype=bool)
+
+
+@dataclass
+class Plantilla:
+    """Plantilla de personal normalizada en arrays posicionales"""
+    ids: np.ndarray
+    unidades: np.ndarray
+    turnos: np.ndarray
+    jornadas: np.ndarray
+    max_horas: np.ndarray
+    max_jornadas: np.ndarray
+    ausencias: MapaAusencias
+    pools: dict
+
+    def __len__(self):
+        return len(self.ids)
+
+    def candidatos(self, unidad, turno):
+        """Posiciones de las enfermeras de `unidad` contratadas para `turno`"""
+        return self.pools.get((unidad, turno), _SIN_CANDIDATOS)
+
+    def subconjunto(self, pos):
+        """Plantilla con solo las enfermeras de las posiciones `pos`, en el mismo orden"""
+        unidades, turnos = self.unidades[pos], self.turnos[pos]
+        return Plantilla(
+            ids=self.ids[pos],
+            unidades=unidades,
+            turnos=turnos,
+            jornadas=self.jornadas[pos],
+            max_horas=self.max_horas[pos],
+            max_jornadas=self.max_jornadas[pos],
+            ausencias=MapaAusencias(origen=self.ausencias.origen, matriz=self.ausencias.matriz[:, pos]),
+            pools=_indice_pools(unidades, turnos) if len(pos) else {},
+        )
+
+
+_SIN_CANDIDATOS = np.array([], dtype=np.intp)
+
+
+def _indice_pools(unidades, turnos):
+    """Agrupa las posiciones de la plantilla por (Unidad_Asignada, Turno_Contrato)"""
+    claves = pd.MultiIndex.from_arrays([unidades, turnos])
+    return {clave: np.asarray(pos, dtype=np.intp)
+            for clave, pos in pd.Series(np.arange(len(unidades))).groupby(claves).indices.items()}
+
+
+def cargar_plantilla(staff):
+    """Normaliza el DataFrame de personal y calcula los límites de cada enfermera"""
+    if isinstance(staff, Plantilla):
+        return staff
+    staff = staff.copy()
+    staff.columns = staff.columns.str.strip()
+    if "Fechas_No_Disponibilidad" not in staff.columns:
+        staff["Fechas_No_Disponibilidad"] = None
+    _comprobar_columnas(staff, COLUMNAS_PLANTILLA)
+
+    turnos = staff["Turno_Contrato"].astype(str).str.strip().to_numpy(dtype=object)
+    jornadas = staff["Jornada"].astype(str).str.strip().to_numpy(dtype=object)
+    desconocidos = sorted(set(turnos) - set(BASE_MAX_HOURS))
+    if desconocidos:
+        raise ValueError(f"Turno_Contrato no reconocido: {desconocidos}")
+
+    unidades = staff["Unidad_Asignada"].astype(str).str.strip().to_numpy(dtype=object)
+    factor = np.where(jornadas == "Parcial", FACTOR_PARCIAL, 1.0)
+    return Plantilla(
+        ids=staff["ID"].to_numpy(dtype=object),
+        unidades=unidades,
+        turnos=turnos,
+        jornadas=jornadas,
+        max_horas=np.array([BASE_MAX_HOURS[t] for t in turnos], dtype=float) * factor,
+        max_jornadas=np.array([BASE_MAX_JORNADAS[t] for t in turnos], dtype=float) * factor,
+        ausencias=MapaAusencias.compilar([parse_dates(c) for c in staff["Fechas_No_Disponibilidad"]]),
+        pools=_indice_pools(unidades, turnos),
+    )
+
+
+def preparar_demanda(demand):
+    """Valida la demanda y la ordena por fecha manteniendo el orden original en empates.
+
+    Los límites son anuales y el histórico se carga para un solo año, así que una
+    demanda que cruza el 1 de enero se rechaza: hay que planificar cada año por separado.
+    """
+    demand = demand.copy()
+    demand.columns = demand.columns.str.strip()
+    _comprobar_columnas(demand, COLUMNAS_DEMANDA)
+    demand = demand[COLUMNAS_DEMANDA].dropna(subset=["Fecha"])
+    demand["Fecha"] = _normalizar_fechas(demand["Fecha"])
+    años = sorted(demand["Fecha"].str[:4].unique())
+    if len(años) > 1:
+        raise ValueError(f"La demanda abarca varios años ({', '.join(años)}); planifica cada año por separado")
+    demand["Personal_Requerido"] = demand["Personal_Requerido"].fillna(0).astype(int)
+    return demand.sort_values(by="Fecha", kind="stable").reset_index(drop=True)
+
+
+@dataclass
+class EstadoEnfermeras:
+    """Estado acumulado de cada enfermera, indexado por posición en la plantilla"""
+    horas: np.ndarray
+    jornadas: np.ndarray
+    ultimo_dia: np.ndarray
+    racha: np.ndarray
+    fin_ultimo_turno: np.ndarray  # horas desde el ordinal 0
+
+    @classmethod
+    def inicial(cls, plantilla, historico=None):
+        """Estado de partida, sembrado opcionalmente con el histórico agregado por enfermera.
+
+        `historico` es un DataFrame con `ID` y cualquiera de `Horas_Acumuladas`,
+        `Jornadas_Acumuladas`, `Ultima_Fecha` y `Racha` (como `db_manager.obtener_historico_anual`,
+        que da los acumulados del año para comparar con los límites anuales).
+        `Ultima_Fecha` debe ser anterior al primer día de la demanda.
+        """
+        n = len(plantilla)
+        estado = cls(
+            horas=np.zeros(n, dtype=float),
+            jornadas=np.zeros(n, dtype=np.int32),
+            ultimo_dia=np.full(n, SIN_DIA, dtype=np.int64),
+            racha=np.zeros(n, dtype=np.int32),
+            fin_ultimo_turno=np.full(n, SIN_FIN, dtype=float),
+        )
+        if historico is None or len(historico) == 0:
+            return estado
+
+        historico = historico.drop_duplicates(subset="ID", keep="last")
+        historico = historico.set_index(historico["ID"].astype(str))
+        claves = pd.Index(plantilla.ids.astype(str))
+        if "Horas_Acumuladas" in historico:
+            estado.horas[:] = historico["Horas_Acumuladas"].reindex(claves).fillna(0).to_numpy(dtype=float)
+        if "Jornadas_Acumuladas" in historico:
+            estado.jornadas[:] = historico["Jornadas_Acumuladas"].reindex(claves).fillna(0).to_numpy(dtype=np.int32)
+        if "Ultima_Fecha" in historico:
+            ultima = pd.to_datetime(historico["Ultima_Fecha"].reindex(claves))
+            pos = np.flatnonzero(ultima.notna().to_numpy())
+            if len(pos):
+                dias = ultima.iloc[pos].to_numpy().astype("datetime64[D]").astype(np.int64) + _ORDINAL_EPOCH
+                inicio = dias * 24.0 + np.array([SHIFT_START_HOUR[t] for t in plantilla.turnos[pos]])
+                duracion = np.array([SHIFT_HOURS[t] for t in plantilla.turnos[pos]])
+                estado.ultimo_dia[pos] = dias
+                # Sin `Racha` solo se conoce el último día: la racha se cuenta desde él
+                estado.racha[pos] = 1
+                if "Racha" in historico:
+                    racha = historico["Racha"].reindex(claves).fillna(0).to_numpy(dtype=np.int32)[pos]
+                    estado.racha[pos] = np.maximum(racha, 1)
+                estado.fin_ultimo_turno[pos] = inicio + duracion
+        return estado
+
+    def registrar(self, pos, dia, turno):
+        """Actualiza el estado de las enfermeras en `pos` tras asignarles `turno` el día `dia`"""
+        continua = self.ultimo_dia[pos] == dia - 1
+        self.racha[pos] = np.where(continua, self.racha[pos] + 1, 1)
+        self.ultimo_dia[pos] = dia
+        self.fin_ultimo_turno[pos] = inicio_turno(dia, turno) + SHIFT_HOURS[turno]
+        self.horas[pos] += SHIFT_HOURS[turno]
+        self.jornadas[pos] += 1
+
+
+def inicio_turno(dia, turno):
+    """Hora de inicio del turno como horas transcurridas desde el ordinal 0"""
+    return dia * 24.0 + SHIFT_START_HOUR[turno]
+
+
+def _cumple_reglas(plantilla, estado, pos, dia, turno):
+    """Máscaras de cumplimiento de cada regla de `REGLAS` para las posiciones `pos`"""
+    horas_turno = SHIFT_HOURS[turno]
+    racha_nueva = np.where(estado.ultimo_dia[pos] == dia - 1, estado.racha[pos] + 1, 1)
+    return (
+        ~plantilla.ausencias.ausentes(dia, pos),
+        estado.ultimo_dia[pos] != dia,
+        estado.jornadas[pos] < plantilla.max_jornadas[pos],
+        estado.horas[pos] + horas_turno <= plantilla.max_horas[pos],
+        racha_nueva < MAX_DIAS_CONSECUTIVOS,
+        inicio_turno(dia, turno) - estado.fin_ultimo_turno[pos] >= MIN_DESCANSO_HORAS,
+    )
+
+
+def _candidatos_validos(plantilla, estado, pos, dia, turno):
+    """Filtra las posiciones `pos` aplicando las reglas; devuelve también las máscaras por regla"""
+    reglas = _cumple_reglas(plantilla, estado, pos, dia, turno)
+    ok = reglas[0].copy()
+    for cumple in reglas[1:]:
+        ok &= cumple
+    return pos[ok], reglas
+
+
+def _rechazos(reglas):
+    """Candidatas descartadas por cada regla, atribuyendo cada una a la primera que incumple"""
+    vivas = np.ones(len(reglas[0]), dtype=bool)
+    cuentas = []
+    for cumple in reglas:
+        cuentas.append(int(np.count_nonzero(vivas & ~cumple)))
+        vivas &= cumple
+    return cuentas
+
+
+def _asignar_bloque(plantilla, demand, historico=None, avance=None):
+    """Bucle voraz sobre `demand` ya preparada.
+
+    Las filas de los resultados llevan como índice la fila de demanda que las
+    originó, para poder fusionar bloques resueltos por separado. Si se da
+    `avance`, se llama con `(días hechos, días totales)` al empezar cada día.
+    """
+    estado = EstadoEnfermeras.inicial(plantilla, historico)
+    medicion = activa()
+    total_dias = demand["Fecha"].nunique() if avance is not None else 0
+    dias_hechos, fecha_anterior = 0, None
+
+    sin_motivos = [0] * len(REGLAS)
+    rechazos_totales = np.zeros(len(REGLAS), dtype=np.int64)
+    evaluadas = 0
+
+    # Por cada fila de demanda cubierta (posición) se guarda el array de enfermeras elegidas
+    elegidas, filas_assign, uncovered, filas_uncov = [], [], [], []
+    for i, (fila, fecha, unidad, turno, req) in enumerate(demand.itertuples(name=None)):
+        if avance is not None and fecha != fecha_anterior:
+            avance(dias_hechos, total_dias)
+            dias_hechos, fecha_anterior = dias_hechos + 1, fecha
+        dia = date.fromisoformat(fecha).toordinal()
+        horas_turno = SHIFT_HOURS.get(turno)
+        elegidos, pool, rechazos = _SIN_CANDIDATOS, _SIN_CANDIDATOS, sin_motivos
+        if horas_turno is not None and req > 0:
+            pool = plantilla.candidatos(unidad, turno)
+            pos, reglas = _candidatos_validos(plantilla, estado, pool, dia, turno)
+            # Los motivos solo se desglosan si hacen falta: hueco sin cubrir o medición activa
+            if len(pos) < req or medicion is not None:
+                rechazos = _rechazos(reglas)
+                if medicion is not None:
+                    evaluadas += len(pool)
+                    rechazos_totales += rechazos
+            # Menor carga primero; en empate se respeta el orden de la plantilla
+            orden = np.argsort(estado.horas[pos], kind="stable")
+            elegidos = pos[orden[:req]]
+            estado.registrar(elegidos, dia, turno)
+
+        if len(elegidos):
+            elegidas.append(elegidos)
+            filas_assign.append(i)
+        if len(elegidos) < req:
+            uncovered.append((fecha, unidad, turno, req - len(elegidos), len(pool), *rechazos))
+            filas_uncov.append(fila)
+
+    if medicion is not None:
+        medicion.contar("motor.candidatos_evaluados", evaluadas)
+        for regla, n in zip(REGLAS, rechazos_totales):
+            medicion.contar(f"motor.rechazos.{regla}", n)
+        medicion.contar("motor.filas_demanda", len(demand))
+        medicion.contar("motor.asignaciones", sum(map(len, elegidas)))
+        medicion.contar("motor.filas_sin_cubrir", len(uncovered))
+    if avance is not None:
+        avance(total_dias, total_dias)
+    df_assign = _tabla_asignaciones(plantilla, demand, elegidas, filas_assign)
+    df_uncov = pd.DataFrame(uncovered, columns=COLUMNAS_SIN_CUBRIR + COLUMNAS_MOTIVOS, index=filas_uncov)
+    return df_assign, df_uncov
+
+
+def _tabla_asignaciones(plantilla, demand, elegidas, filas):
+    """DataFrame de asignaciones construido con códigos enteros en lugar de una tupla por fila.
+
+    `elegidas[k]` son las posiciones en la plantilla asignadas a la fila de
+    demanda `filas[k]` (posicional). Las columnas de `COLUMNAS_CATEGORICAS`
+    salen categóricas; el índice es el de `demand`.
+    """
+    n = np.fromiter(map(len, elegidas), dtype=np.intp, count=len(elegidas))
+    pos = np.concatenate(elegidas) if elegidas else _SIN_CANDIDATOS
+    filas = np.repeat(np.asarray(filas, dtype=np.intp), n)
+
+    columnas = {}
+    for col, (codigos, categorias) in _factorizar(plantilla, demand).items():
+        columnas[col] = pd.Categorical.from_codes(codigos[filas if col in COLUMNAS_DEMANDA else pos], categorias)
+    columnas["Horas"] = demand["Turno"].map(SHIFT_HOURS).to_numpy(dtype=float)[filas]
+    return pd.DataFrame(columnas, index=demand.index[filas])[COLUMNAS_ASIGNACION]
+
+
+def _factorizar(plantilla, demand):
+    """Códigos y categorías (en orden de aparición) de cada columna de `COLUMNAS_CATEGORICAS`.
+
+    Se factorizan valores planos: sobre una columna ya categórica (la demanda de
+    `entradas.leer_demanda`) pd.factorize devuelve las categorías ordenadas y los
+    códigos por orden de aparición, que no casan entre sí.
+    """
+    columnas = {col: pd.factorize(demand[col].to_numpy(dtype=object)) for col in ["Fecha", "Unidad", "Turno"]}
+    for col, valores in (("ID_Enfermera", plantilla.ids), ("Jornada", plantilla.jornadas)):
+        columnas[col] = pd.factorize(np.asarray(valores, dtype=object))
+    return columnas
+
+
+def compactar_asignaciones(df):
+    """Pasa a categóricas las columnas de `COLUMNAS_CATEGORICAS` que aún no lo son"""
+    columnas = {c: "category" for c in COLUMNAS_CATEGORICAS
+                if c in df.columns and not isinstance(df[c].dtype, pd.CategoricalDtype)}
+    return df.astype(columnas) if columnas else df
+
+
+def _concatenar(partes):
+    """Concatena conservando las columnas categóricas (pd.concat las pasaría a texto si difieren).
+
+    Las partes vacías se omiten: sus columnas son de tipo object y contaminarían las demás.
+    """
+    partes = [p for p in partes if len(p)] or list(partes[:1])
+    df = pd.concat(partes)
+    for col in df.columns:
+        if all(isinstance(p[col].dtype, pd.CategoricalDtype) for p in partes) \
+                and not isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = union_categoricals([p[col] for p in partes])
+    return df
+
+
+def particionar_por_unidad(plantilla, demand):
+    """Divide plantilla y demanda en problemas independientes, uno por unidad.
+
+    Devuelve una lista de `(plantilla_unidad, demanda_unidad)` de mayor a menor
+    demanda; cada demanda conserva el índice de fila original.
+    """
+    particiones = []
+    grupos = demand.groupby("Unidad", sort=False, dropna=False, observed=True).indices
+    for unidad, filas in grupos.items():
+        pos = np.flatnonzero(plantilla.unidades == unidad)
+        particiones.append((plantilla.subconjunto(pos), demand.iloc[filas]))
+    particiones.sort(key=lambda p: len(p[1]), reverse=True)
+    return particiones
+
+
+def _historico_de(plantilla, historico):
+    if historico is None or len(historico) == 0:
+        return historico
+    return historico[historico["ID"].astype(str).isin(plantilla.ids.astype(str))]
+
+
+def _fusionar(resultados, plantilla=None, demand=None):
+    """Une los resultados por bloque en el orden de las filas de demanda.
+
+    Con la plantilla y la demanda completas, las categorías de df_assign se fijan
+    a las de una ejecución en serie (cada bloque solo conoce las suyas).
+    """
+    assigns, uncovs = zip(*resultados)
+    df_assign = _concatenar(assigns).sort_index(kind="stable").reset_index(drop=True)
+    if plantilla is not None and len(resultados) > 1:
+        for col, (_, categorias) in _factorizar(plantilla, demand).items():
+            df_assign[col] = df_assign[col].astype("category").cat.set_categories(categorias)
+    df_uncov = _concatenar(uncovs).sort_index(kind="stable").reset_index(drop=True)
+    return df_assign, df_uncov
+
+
+def _asignar_en_paralelo(particiones, historico, procesos, avance=None):
+    """Resuelve cada partición en un proceso; el avance se estima por filas de demanda terminadas"""
+    total_filas = sum(len(d) for _, d in particiones)
+    total_dias = pd.concat([d["Fecha"] for _, d in particiones]).nunique() if avance is not None else 0
+    resultados = [None] * len(particiones)
+    if avance is not None:
+        avance(0, total_dias)
+    pool = ProcessPoolExecutor(max_workers=min(procesos, len(particiones)))
+    try:
+        futuros = {
+            pool.submit(_asignar_bloque, p, d, _historico_de(p, historico)): i
+            for i, (p, d) in enumerate(particiones)
+        }
+        filas_hechas = 0
+        for futuro in as_completed(futuros):
+            i = futuros[futuro]
+            resultados[i] = futuro.result()
+            filas_hechas += len(particiones[i][1])
+            if avance is not None:
+                avance(total_dias * filas_hechas // max(total_filas, 1), total_dias)
+    finally:
+        # Al cancelar o fallar no se espera a las particiones que aún no han empezado
+        pool.shutdown(wait=True, cancel_futures=True)
+    return resultados
+
+
+def ejecutar_asignacion(staff, demand, historico=None, procesos=PROCESOS_POR_DEFECTO, avance=None):
+    """Asigna la demanda a la plantilla con el criterio voraz de menor carga horaria.
+
+    Devuelve `(df_assign, df_uncov)` con las columnas de `COLUMNAS_ASIGNACION`
+    (las de texto, categóricas) y `COLUMNAS_SIN_CUBRIR`. Cada hueco lleva además su diagnóstico
+    (`COLUMNAS_MOTIVOS`): enfermeras del pool y cuántas descartó cada regla en
+    ese momento, sin necesidad de volver a ejecutar. `historico` es el agregado opcional por enfermera
+    (ver `EstadoEnfermeras.inicial`) que se suma a los límites anuales.
+
+    Con `procesos > 1` cada unidad se resuelve en un proceso distinto; el
+    resultado es idéntico al de la ejecución en serie. `avance(hechos, total)`,
+    opcional, recibe los días de demanda procesados; si lanza una excepción la
+    asignación se interrumpe (así se cancelan los trabajos en segundo plano).
+    """
+    with tramo("motor.preparar"):
+        plantilla = cargar_plantilla(staff)
+        demand = preparar_demanda(demand)
+
+    procesos = max(1, min(int(procesos), MAX_PROCESOS))
+    particiones = particionar_por_unidad(plantilla, demand) if procesos > 1 else []
+    if len(particiones) < 2:
+        with tramo("motor.asignar"):
+            resultados = [_asignar_bloque(plantilla, demand, historico, avance)]
+    else:
+        with tramo("motor.asignar_paralelo"):
+            resultados = _asignar_en_paralelo(particiones, historico, procesos, avance)
+    with tramo("motor.fusionar"):
+        return _fusionar(resultados, plantilla, demand)
+
+
+def resumen_mensual(df_assign):
+    """Agrupa las asignaciones por profesional, unidad, turno, jornada, año y mes"""
+    fechas = pd.to_datetime(df_assign["Fecha"])
+    return (df_assign.assign(Año=fechas.dt.year, Mes=fechas.dt.month)
+            .groupby(["ID_Enfermera", "Unidad", "Turno", "Jornada", "Año", "Mes"], observed=True)
+            .agg(Horas_Asignadas=("Horas", "sum"),
+                 Jornadas_Asignadas=("Fecha", "count"))
+            .reset_index()
+            .rename(columns={"ID_Enfermera": "ID"}))
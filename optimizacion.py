@@ -0,0 +1,383 @@
+"""Modo de asignación optimizado, partiendo de la solución voraz.
+
+Cada enfermera solo puede cubrir su propia (Unidad_Asignada, Turno_Contrato), así
+que el problema se separa en grupos independientes. Dentro de un grupo, el flujo
+de un único día es trivial (basta con elegir a las k enfermeras libres de menor
+carga, que es lo que hace el voraz); lo que el voraz no ve es el acoplamiento
+entre días: racha máxima, topes anuales y ausencias. Por eso cada grupo se
+representa como una matriz enfermera × día y se mejora con búsqueda local:
+
+1. Cobertura: para cada hueco se busca una enfermera libre que pueda hacerlo y,
+   si todas están bloqueadas por el tope o la racha, se prueba una cadena de
+   expulsión (la enfermera cede uno de sus días a otra que sí pueda hacerlo).
+2. Equidad: se trasladan turnos de las enfermeras con más horas a las que menos
+   tienen mientras la diferencia supere un turno.
+
+Ningún movimiento empeora la cobertura ni rompe las reglas del voraz (mismos
+SHIFT_HOURS, límites anuales, racha y descanso), y la búsqueda se detiene al
+agotar el tiempo indicado.
+"""
+import time
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from instrumentacion import tramo
+from motor_asignacion import (
+    _ORDINAL_EPOCH, COLUMNAS_ASIGNACION, COLUMNAS_MOTIVOS, COLUMNAS_SIN_CUBRIR, MAX_DIAS_CONSECUTIVOS, REGLAS,
+    MIN_DESCANSO_HORAS, PROCESOS_POR_DEFECTO, SHIFT_HOURS, SHIFT_START_HOUR, EstadoEnfermeras,
+    _rechazos, cargar_plantilla, compactar_asignaciones, ejecutar_asignacion, inicio_turno, preparar_demanda,
+)
+
+TIEMPO_MAX_OPTIMIZACION = 10.0
+MAX_RACHA = MAX_DIAS_CONSECUTIVOS - 1
+
+
+@dataclass
+class _Grupo:
+    """Enfermeras de una (unidad, turno) sobre días consecutivos.
+
+    La columna 0 es el día anterior al horizonte: solo refleja el histórico
+    (para la racha) y nunca se asigna ni se libera. `racha0` son los días seguidos
+    trabajados hasta ella según el histórico (0 si no se trabajó).
+    """
+    unidad: str
+    turno: str
+    pos: np.ndarray          # posiciones en la plantilla
+    dia0: int                # ordinal de la columna 0
+    asignado: np.ndarray     # enfermera × día
+    disponible: np.ndarray   # enfermera × día: sin ausencia y con descanso suficiente
+    cupo: np.ndarray         # jornadas que aún puede hacer cada enfermera en el horizonte
+    cuenta: np.ndarray       # jornadas asignadas en el horizonte
+    horas: np.ndarray        # histórico + horizonte
+    requerido: np.ndarray    # por día
+    racha0: np.ndarray = None
+
+    @property
+    def horas_turno(self):
+        return SHIFT_HOURS[self.turno]
+
+    def faltan(self):
+        return np.maximum(self.requerido - self.asignado.sum(axis=0), 0)
+
+    def _extra_racha(self):
+        """Días de racha anteriores a la columna 0 que no caben en la matriz"""
+        if self.racha0 is None:
+            return np.zeros(len(self.pos), dtype=np.int64)
+        return np.maximum(self.racha0 - 1, 0)
+
+    def poner(self, n, d):
+        self.asignado[n, d] = True
+        self.cuenta[n] += 1
+        self.horas[n] += self.horas_turno
+
+    def quitar(self, n, d):
+        self.asignado[n, d] = False
+        self.cuenta[n] -= 1
+        self.horas[n] -= self.horas_turno
+
+    def _racha_ok(self, n, d):
+        fila = self.asignado[n]
+        izq = 0
+        while izq < MAX_RACHA and d - izq - 1 >= 0 and fila[d - izq - 1]:
+            izq += 1
+        if izq == d and d > 0:
+            izq += self._extra_racha()[n]
+        der = 0
+        while der < MAX_RACHA and d + der + 1 < len(fila) and fila[d + der + 1]:
+            der += 1
+        return izq + der + 1 <= MAX_RACHA
+
+    def puede(self, n, d):
+        return (d > 0 and self.disponible[n, d] and not self.asignado[n, d]
+                and self.cuenta[n] < self.cupo[n] and self._racha_ok(n, d))
+
+    def racha_libre(self):
+        """Matriz enfermera × día: True si añadir ese día no supera la racha máxima"""
+        x = self.asignado
+        n, dias = x.shape
+        izq = np.zeros((n, dias), dtype=np.int16)
+        der = np.zeros((n, dias), dtype=np.int16)
+        vivo_izq = np.ones((n, dias), dtype=bool)
+        vivo_der = np.ones((n, dias), dtype=bool)
+        for k in range(1, MAX_RACHA + 1):
+            vivo_izq[:, k:] &= x[:, :-k] if k < dias else False
+            vivo_izq[:, :k] = False
+            vivo_der[:, :-k] &= x[:, k:] if k < dias else False
+            vivo_der[:, -k:] = False
+            izq += vivo_izq
+            der += vivo_der
+        # Las rachas que llegan a la columna 0 continúan en el histórico
+        llega = izq == np.arange(dias)[None, :]
+        izq += np.where(llega, self._extra_racha()[:, None], 0).astype(np.int16)
+        return izq + der + 1 <= MAX_RACHA
+
+    def insertables(self):
+        """Matriz enfermera × día de las asignaciones nuevas que respetan todas las reglas"""
+        ok = self.disponible & ~self.asignado & self.racha_libre()
+        ok &= (self.cuenta < self.cupo)[:, None]
+        ok[:, 0] = False
+        return ok
+
+
+def _ordinales(fechas):
+    return pd.to_datetime(fechas).to_numpy().astype("datetime64[D]").astype(np.int64) + _ORDINAL_EPOCH
+
+
+def _cupo(plantilla, estado, pos, turno):
+    """Jornadas adicionales que admiten a la vez el tope de jornadas y el de horas"""
+    h = SHIFT_HOURS[turno]
+    por_jornadas = np.ceil(plantilla.max_jornadas[pos] - estado.jornadas[pos])
+    por_horas = np.floor((plantilla.max_horas[pos] - estado.horas[pos]) / h + 1e-9)
+    return np.maximum(np.minimum(por_jornadas, por_horas), 0).astype(np.int64)
+
+
+def construir_grupos(plantilla, demand, dias, estado, df_assign_inicial):
+    """Matrices por (unidad, turno) cargadas con `df_assign_inicial`.
+
+    Se ignoran las asignaciones que ya no encajan en ningún grupo (enfermera que
+    no está en la plantilla o fecha sin demanda para esa unidad y turno).
+    """
+    ids_a_pos = {}
+    grupos = {}
+    claves = demand[["Unidad", "Turno"]].drop_duplicates().itertuples(index=False, name=None)
+    for unidad, turno in claves:
+        if turno not in SHIFT_HOURS:
+            continue
+        pos = plantilla.candidatos(unidad, turno)
+        filas = (demand["Unidad"] == unidad).to_numpy() & (demand["Turno"] == turno).to_numpy()
+        dia0 = int(dias[filas].min()) - 1
+        n_dias = int(dias[filas].max()) - dia0 + 1
+        requerido = np.zeros(n_dias, dtype=np.int64)
+        np.add.at(requerido, dias[filas] - dia0, np.maximum(demand["Personal_Requerido"].to_numpy()[filas], 0))
+
+        ordinales = np.arange(dia0, dia0 + n_dias)
+        disponible = np.ones((len(pos), n_dias), dtype=bool)
+        for j, dia in enumerate(ordinales):
+            disponible[:, j] &= ~plantilla.ausencias.ausentes(int(dia), pos)
+        inicio = ordinales * 24.0 + SHIFT_START_HOUR[turno]
+        disponible &= (inicio[None, :] - estado.fin_ultimo_turno[pos][:, None]) >= MIN_DESCANSO_HORAS
+        disponible[:, 0] = False
+
+        asignado = np.zeros((len(pos), n_dias), dtype=bool)
+        asignado[:, 0] = estado.ultimo_dia[pos] == dia0
+        grupos[(unidad, turno)] = _Grupo(
+            unidad=unidad, turno=turno, pos=pos, dia0=dia0,
+            asignado=asignado, disponible=disponible,
+            cupo=_cupo(plantilla, estado, pos, turno),
+            cuenta=np.zeros(len(pos), dtype=np.int64),
+            horas=estado.horas[pos].astype(float).copy(),
+            requerido=requerido,
+            racha0=np.where(asignado[:, 0], estado.racha[pos], 0),
+        )
+        ids_a_pos[(unidad, turno)] = {plantilla.ids[p]: i for i, p in enumerate(pos)}
+
+    fechas = _ordinales(df_assign_inicial["Fecha"])
+    for dia, unidad, turno, id_ in zip(fechas, df_assign_inicial["Unidad"], df_assign_inicial["Turno"],
+                                       df_assign_inicial["ID_Enfermera"]):
+        g = grupos.get((unidad, turno))
+        if g is None:
+            continue
+        n, d = ids_a_pos[(unidad, turno)].get(id_), int(dia) - g.dia0
+        if n is not None and 0 < d < g.asignado.shape[1] and not g.asignado[n, d]:
+            g.poner(n, d)
+    return grupos
+
+
+def cubrir_hueco(g, d):
+    """Intenta añadir una enfermera el día `d`; True si lo consigue"""
+    libres = np.flatnonzero(g.disponible[:, d] & ~g.asignado[:, d])
+    if not len(libres):
+        return False
+    libres = libres[np.argsort(g.horas[libres], kind="stable")]
+    for n in libres:
+        if g.puede(n, d):
+            g.poner(n, d)
+            return True
+
+    # Cadena de expulsión: n cede uno de sus días e a otra enfermera m y cubre d
+    ok = g.insertables()
+    cedibles = ok.any(axis=0)
+    for n in libres:
+        for e in np.flatnonzero(g.asignado[n] & cedibles):
+            if e == 0:
+                continue
+            g.quitar(n, e)
+            if g.puede(n, d):
+                receptores = np.flatnonzero(ok[:, e])
+                receptores = receptores[receptores != n]
+                for m in receptores[np.argsort(g.horas[receptores], kind="stable")]:
+                    if g.puede(m, e):
+                        g.poner(m, e)
+                        g.poner(n, d)
+                        return True
+            g.poner(n, e)
+    return False
+
+
+def mejorar_cobertura(g, limite, dias=None):
+    """Cubre huecos del grupo hasta `limite`; con `dias` (columnas) solo los de esos días"""
+    huecos = np.flatnonzero(g.faltan())
+    if dias is not None:
+        huecos = np.intersect1d(huecos, dias)
+    for d in huecos:
+        while g.faltan()[d] and time.perf_counter() < limite:
+            if not cubrir_hueco(g, d):
+                break
+
+
+def _equilibrar(g, limite):
+    """Traslada turnos de las enfermeras más cargadas a las menos cargadas"""
+    h = g.horas_turno
+    while time.perf_counter() < limite:
+        ok = g.insertables()
+        cedibles = ok.any(axis=0)
+        movido = False
+        for n in np.argsort(-g.horas, kind="stable"):
+            if g.horas[n] - g.horas.min() <= h:
+                break
+            for e in np.flatnonzero(g.asignado[n] & cedibles):
+                if e == 0:
+                    continue
+                receptores = np.flatnonzero(ok[:, e])
+                m = receptores[np.argmin(g.horas[receptores])]
+                if g.horas[m] + h < g.horas[n]:
+                    g.quitar(n, e)
+                    g.poner(m, e)
+                    movido = True
+                    break
+            if movido:
+                break
+        if not movido:
+            return
+
+
+def motivos_celda(plantilla, estado, g, d, elegidas=0, racha_libre=None):
+    """`Candidatas` y rechazos por regla (como en `COLUMNAS_MOTIVOS`) del día `d` del grupo.
+
+    Se evalúa el plan final: cada enfermera no asignada ese día cuenta en la primera
+    regla de `REGLAS` que incumple, igual que en el voraz. Las asignadas al día
+    cuentan como `ya_asignada` salvo las `elegidas` para la fila en cuestión.
+    `racha_libre` permite reutilizar `g.racha_libre()` entre días del mismo grupo.
+    """
+    if racha_libre is None:
+        racha_libre = g.racha_libre()
+    pos, dia = g.pos, g.dia0 + d
+    reglas = (
+        ~plantilla.ausencias.ausentes(dia, pos),
+        ~g.asignado[:, d],
+        estado.jornadas[pos] + g.cuenta < plantilla.max_jornadas[pos],
+        g.horas + g.horas_turno <= plantilla.max_horas[pos],
+        racha_libre[:, d],
+        inicio_turno(dia, g.turno) - estado.fin_ultimo_turno[pos] >= MIN_DESCANSO_HORAS,
+    )
+    rechazos = _rechazos(reglas)
+    rechazos[REGLAS.index("ya_asignada")] -= elegidas
+    return [len(pos)] + rechazos
+
+
+def grupos_a_dataframes(plantilla, demand, dias, grupos, estado):
+    """Reparte las enfermeras de cada grupo y día entre las filas de demanda, en orden.
+
+    Los huecos llevan las columnas de `COLUMNAS_MOTIVOS` calculadas sobre el plan final.
+    """
+    assignments, uncovered = [], []
+    pendientes = {}
+    for (unidad, turno), g in grupos.items():
+        for d in range(1, g.asignado.shape[1]):
+            pendientes[(unidad, turno, g.dia0 + d)] = list(g.pos[np.flatnonzero(g.asignado[:, d])])
+
+    rachas = {}
+    sin_motivos = [0] * len(COLUMNAS_MOTIVOS)
+    for (fecha, unidad, turno, req), dia in zip(demand.itertuples(index=False, name=None), dias):
+        elegidos, g = [], None
+        if turno in SHIFT_HOURS and req > 0:
+            g = grupos.get((unidad, turno))
+            libres = pendientes.get((unidad, turno, int(dia)), [])
+            elegidos, pendientes[(unidad, turno, int(dia))] = libres[:req], libres[req:]
+        for p in elegidos:
+            assignments.append((fecha, unidad, turno, plantilla.ids[p], plantilla.jornadas[p], SHIFT_HOURS[turno]))
+        if len(elegidos) < req:
+            motivos = sin_motivos
+            if g is not None:
+                if (unidad, turno) not in rachas:
+                    rachas[(unidad, turno)] = g.racha_libre()
+                motivos = motivos_celda(plantilla, estado, g, int(dia) - g.dia0, len(elegidos), rachas[(unidad, turno)])
+            uncovered.append((fecha, unidad, turno, req - len(elegidos), *motivos))
+    return (pd.DataFrame(assignments, columns=COLUMNAS_ASIGNACION),
+            pd.DataFrame(uncovered, columns=COLUMNAS_SIN_CUBRIR + COLUMNAS_MOTIVOS))
+
+
+def metricas_asignacion(plantilla, df_assign, df_uncov, historico=None):
+    """Cobertura y equidad de una asignación.
+
+    La equidad se mide sobre las horas totales (histórico + asignadas) dentro de
+    cada grupo de enfermeras comparables (misma unidad y turno de contrato).
+    """
+    plantilla = cargar_plantilla(plantilla)
+    cubiertos = len(df_assign)
+    sin_cubrir = int(df_uncov["Faltan"].sum()) if len(df_uncov) else 0
+    base = EstadoEnfermeras.inicial(plantilla, historico).horas
+    asignadas = df_assign.groupby(df_assign["ID_Enfermera"].astype(object))["Horas"].sum()
+    horas = pd.Series(base + asignadas.reindex(plantilla.ids).fillna(0).to_numpy())
+    grupos = horas.groupby([plantilla.unidades, plantilla.turnos])
+    return {
+        "Turnos cubiertos": cubiertos,
+        "Turnos sin cubrir": sin_cubrir,
+        "Cobertura (%)": round(100.0 * cubiertos / (cubiertos + sin_cubrir), 2) if cubiertos + sin_cubrir else 100.0,
+        "Desviación de horas (media por grupo)": round(float(grupos.std(ddof=0).mean()), 2),
+        "Rango de horas (media por grupo)": round(float((grupos.max() - grupos.min()).mean()), 2),
+    }
+
+
+def comparar_asignaciones(plantilla, voraz, optima, historico=None):
+    """DataFrame con las métricas de la solución voraz y la optimizada, lado a lado"""
+    return pd.DataFrame({
+        "Voraz": metricas_asignacion(plantilla, *voraz, historico),
+        "Optimizada": metricas_asignacion(plantilla, *optima, historico),
+    })
+
+
+def ejecutar_asignacion_optima(staff, demand, historico=None, tiempo_max=TIEMPO_MAX_OPTIMIZACION,
+                               procesos=PROCESOS_POR_DEFECTO, avance=None):
+    """Asignación voraz mejorada por búsqueda local durante como mucho `tiempo_max` segundos.
+
+    Devuelve `(df_assign, df_uncov, informe)`; los DataFrames tienen el mismo
+    formato que `ejecutar_asignacion` e `informe` compara cobertura y equidad
+    con la solución voraz de partida. `avance` informa de los días de la fase
+    voraz y se vuelve a llamar tras cada grupo de la búsqueda local, de modo
+    que una cancelación también la interrumpe.
+    """
+    inicio = time.perf_counter()
+    plantilla = cargar_plantilla(staff)
+    demand = preparar_demanda(demand)
+    voraz = ejecutar_asignacion(plantilla, demand, historico=historico, procesos=procesos, avance=avance)
+    total_dias = demand["Fecha"].nunique()
+
+    estado = EstadoEnfermeras.inicial(plantilla, historico)
+    dias = _ordinales(demand["Fecha"])
+    with tramo("optimizacion.construir_grupos"):
+        grupos = construir_grupos(plantilla, demand, dias, estado, voraz[0])
+
+    # Primero la cobertura de todos los grupos; el tiempo restante, para la equidad
+    limite = inicio + tiempo_max
+    with tramo("optimizacion.cobertura"):
+        for g in sorted(grupos.values(), key=lambda g: -int(g.faltan().sum())):
+            if time.perf_counter() >= limite:
+                break
+            mejorar_cobertura(g, limite)
+            if avance is not None:
+                avance(total_dias, total_dias)
+    with tramo("optimizacion.equidad"):
+        for g in grupos.values():
+            if time.perf_counter() >= limite:
+                break
+            _equilibrar(g, limite)
+            if avance is not None:
+                avance(total_dias, total_dias)
+
+    optima = grupos_a_dataframes(plantilla, demand, dias, grupos, estado)
+    with tramo("optimizacion.informe"):
+        informe = comparar_asignaciones(plantilla, voraz, optima, historico)
+    return compactar_asignaciones(optima[0]), optima[1], informe
@@ -1,23 +1,27 @@
+import json
+import time
+import uuid
 import streamlit as st
 import pandas as pd
-import ast
 from datetime import datetime, timedelta, date
-from io import BytesIO
 from db_manager import (
-    init_db, guardar_asignaciones, guardar_resumen_mensual,
+    init_db, aprobar_asignaciones, ConflictoAprobacion,
     descargar_bd_desde_drive, subir_bd_a_drive, reset_db, 
-    cargar_horas, obtener_horas_historicas
+    cargar_horas, obtener_historico_anual, obtener_horas_historicas, version_historico
 )
+from motor_asignacion import (
+    COLUMNAS_DEMANDA, MAX_PROCESOS, PROCESOS_POR_DEFECTO, ejecutar_asignacion, resumen_mensual
+)
+from optimizacion import TIEMPO_MAX_OPTIMIZACION, ejecutar_asignacion_optima
+from replanificacion import Cambios, cambios_por_conflicto, replanificar
+from entradas import TIPOS_ENTRADA, leer_demanda, leer_plantilla
+from demanda import DIAS_SEMANA, TURNOS, generar_demanda
+from exportar import FORMATOS, boton_descarga, formatos_disponibles
+from instrumentacion import medir, tramo
+import trabajos
 
-def to_excel_bytes(df):
-    """Convierte un DataFrame a bytes para descarga en Excel"""
-    if df is None or df.empty:
-        return b''  # Retorna bytes vacíos si no hay datos
-    
-    output = BytesIO()
-    with pd.ExcelWriter(output, engine='openpyxl') as writer:
-        df.to_excel(writer, index=False)
-    return output.getvalue()
+#Segundos entre consultas al trabajo en curso
+INTERVALO_SONDEO = 0.5
 
 #Títulos y descripción
 st.set_page_config(page_title="Asignador", layout="wide")
@@ -35,34 +39,44 @@ if "asignacion_completada" not in st.session_state:
         "asignacion_completada": False,
         "df_assign": None,
         "file_staff": None,
-        "df_uncov": None
+        "df_uncov": None,
+        "version_resultado": None
     })
 
 #No sé si realmente es necesario
 if "file_staff" not in st.session_state:
     st.session_state["file_staff"] = None
+if "version_resultado" not in st.session_state:
+    st.session_state["version_resultado"] = None
+
+#Identificador de cada resultado guardado en la sesión. Las descargas se memorizan en una
+#caché común a todas las sesiones, así que no puede ser un contador que empiece igual en cada una
+def nueva_version():
+    return uuid.uuid4().hex
 
 #Inicialización de variables
-SHIFT_HOURS = {"Mañana": 7.5, "Tarde": 7.5, "Noche": 10}
-BASE_MAX_HOURS = {"Mañana": 1642.5, "Tarde": 1642.5, "Noche": 1470}
-BASE_MAX_JORNADAS = {"Mañana": 219, "Tarde": 219, "Noche": 147}
-dias_semana = ["Lunes", "Martes", "Miércoles", "Jueves", "Viernes", "Sábado", "Domingo"]
-turnos = ["Mañana", "Tarde", "Noche"]
+dias_semana = DIAS_SEMANA
+turnos = TURNOS
+
+EXTENSIONES = ", ".join(f".{t}" for t in TIPOS_ENTRADA)
 
 #Subida plantilla de personal. 10/08 añadido if para st.session_state
 st.sidebar.header("1️⃣📂 Suba la plantilla de personal")
-file_staff = st.sidebar.file_uploader("El archivo debe contener las siguientes columnas: Plantilla de personal (.xlsx)", type=["xlsx"])
+file_staff = st.sidebar.file_uploader(f"El archivo debe contener las siguientes columnas: Plantilla de personal ({EXTENSIONES})", type=TIPOS_ENTRADA)
 if file_staff:
     st.session_state["file_staff"] = file_staff
     
 #Configurar la demanda de turnos
-metodo = st.sidebar.selectbox("2️⃣📈 Método para ingresar demanda:", ["Generar manualmente","Desde Excel"])
+metodo = st.sidebar.selectbox("2️⃣📈 Método para ingresar demanda:", ["Generar manualmente","Desde archivo"])
 demand = None
-if metodo == "Desde Excel":
-    file_demand = st.sidebar.file_uploader("Demanda de turnos (.xlsx)", type=["xlsx"])
+if metodo == "Desde archivo":
+    file_demand = st.sidebar.file_uploader(f"Demanda de turnos ({EXTENSIONES})", type=TIPOS_ENTRADA)
     if file_demand:
-        demand = pd.read_excel(file_demand)
-        demand.columns = demand.columns.str.strip()
+        try:
+            demand = leer_demanda(file_demand)
+        except ValueError as e:
+            st.error(f"❌ {e}")
+            st.stop()
         st.subheader("📆 Demanda desde archivo")
         st.dataframe(demand)
 elif metodo == "Generar manualmente":
@@ -71,7 +85,6 @@ elif metodo == "Generar manualmente":
     col1, col2 = st.columns(2)
     fecha_inicio = col1.date_input("Fecha de inicio", value=date(2025, 1, 1))
     fecha_fin = col2.date_input("Fecha de fin", value=date(2025, 1, 31))
-    fechas = [fecha_inicio + timedelta(days=i) for i in range((fecha_fin - fecha_inicio).days + 1)]
     
     #Aviso rango de fechas erróneo
     if fecha_fin <= fecha_inicio:
@@ -88,205 +101,270 @@ elif metodo == "Generar manualmente":
             demanda_por_dia[dia][turno] = cols[i].number_input(
                 label=f"{turno}", min_value=0, max_value=20, value=valor_default, key=f"{dia}_{turno}"
              )
-    demanda = []
-    for fecha in fechas:
-        dia_cast = dias_semana[fecha.weekday()]
-        for turno in turnos:
-             demanda.append({
-                 "Fecha": fecha.isoformat(),
-                 "Unidad": unidad,
-                 "Turno": turno,
-                 "Personal_Requerido": demanda_por_dia[dia_cast][turno]
-             })
-    demand = pd.DataFrame(demanda)
-
-#Aquí está obviando las horas anteriores. En código 31/07 algo así: 
-def cargar_horas_actuales(staff):
-     df_historicas = obtener_horas_historicas()
-    if not df_historicas.empty:
-        return df_historicas.groupby('ID_Enfermera')['Horas'].sum().to_dict()
-     return {row.ID: 0 for _, row in staff.iterrows()}
-    
-
-
-#Ejecutar asignación
-if file_staff is not None and st.button("🚀 Ejecutar asignación"):
-    staff = pd.read_excel(file_staff)
-    staff.columns = staff.columns.str.strip()
+    demand = generar_demanda(fecha_inicio, fecha_fin, unidad, demanda_por_dia)
 
-    staff_hours = cargar_horas_actuales() 
-    # Completa con ceros si no existen registros
-    staff_hours.update({row.ID: 0 for row in staff.itertuples() if row.ID not in staff_hours})
-
-    def parse_dates(cell):
-        if pd.isna(cell): return []
-        try: return [d.strip() for d in ast.literal_eval(str(cell))]
-        except: return [d.strip() for d in str(cell).split(',')]
-
-    staff["Fechas_No_Disponibilidad"] = staff["Fechas_No_Disponibilidad"].apply(parse_dates)
-    
-    #Para jornadas parciales definir 80%
-    staff_max_hours = {
-        row.ID: BASE_MAX_HOURS[row.Turno_Contrato] * (0.8 if row.Jornada == "Parcial" else 1)
-        for _, row in staff.iterrows()
-    }
-    staff_max_jornadas = {
-        row.ID: BASE_MAX_JORNADAS[row.Turno_Contrato] * (0.8 if row.Jornada == "Parcial" else 1)
-        for _, row in staff.iterrows()
-    }
-
-    st.subheader("👩‍⚕️ Personal cargado")
-    st.dataframe(staff)
+#Formato de las descargas (los archivos se generan solo al pedirlos)
+formato_descarga = st.sidebar.selectbox(
+    "⬇️ Formato de descarga", formatos_disponibles(), format_func=lambda f: FORMATOS[f][0]
+)
 
+#Unidades resueltas en paralelo (cada unidad es independiente)
+procesos = st.sidebar.number_input(
+    "⚙️ Procesos en paralelo", min_value=1, max_value=MAX_PROCESOS, value=min(PROCESOS_POR_DEFECTO, MAX_PROCESOS)
+)
 
-    # Carga de horas con la nueva función
-    
-    df_horas_historicas = obtener_horas_acumuladas()
-    if not df_horas_historicas.empty else {row.ID: 0 for _, row in staff.iterrows()}
-    #staff_jornadas = dict.fromkeys(staff["ID"], 0)
-    staff_dates = {row.ID: [] for _, row in staff.iterrows()}
-    assignments, uncovered = [], []
+#Modo de asignación: voraz o mejorado por búsqueda local con límite de tiempo
+modo = st.sidebar.selectbox("🧮 Modo de asignación", ["Voraz (rápido)", "Optimizado"])
+tiempo_max = TIEMPO_MAX_OPTIMIZACION
+if modo == "Optimizado":
+    tiempo_max = st.sidebar.number_input(
+        "⏱️ Tiempo máximo (s)", min_value=1.0, max_value=600.0, value=TIEMPO_MAX_OPTIMIZACION, step=5.0
+    )
+
+#Medición de tiempos y contadores (sin coste si está desactivada)
+medir_rendimiento = st.sidebar.checkbox("⏱️ Medir rendimiento", value=False)
+
+#Horas y jornadas del año de la demanda, y último día trabajado y racha hasta la víspera del plan
+def cargar_horas_actuales(staff, demand):
+    inicio = pd.to_datetime(demand["Fecha"], errors="coerce").min()
+    if pd.isna(inicio):
+        return obtener_historico_anual(staff["ID"], date.today().year)
+    return obtener_historico_anual(staff["ID"], inicio.year, antes_de=inicio)
+
+#Trabajo en segundo plano: no usa st.*, devuelve lo que se guardará en la sesión
+def asignar_en_segundo_plano(staff, plantilla, demand, modo, tiempo_max, procesos, medir_rendimiento, avance=None):
+    with medir("Asignación", activo=medir_rendimiento) as medicion:
+        with tramo("bd.historico"):
+            #El sello se toma antes de leer: un cambio entre ambas lecturas también se detecta
+            version = version_historico()
+            historico = cargar_horas_actuales(staff, demand)
+
+        informe = None
+        if modo == "Optimizado":
+            df_assign, df_uncov, informe = ejecutar_asignacion_optima(
+                plantilla, demand, historico=historico, tiempo_max=tiempo_max, procesos=procesos, avance=avance
+            )
+        else:
+            df_assign, df_uncov = ejecutar_asignacion(
+                plantilla, demand, historico=historico, procesos=procesos, avance=avance
+            )
+
+        with tramo("motor.resumen_mensual"):
+            resumen = resumen_mensual(df_assign)
+
+    return {
+        "asignacion_completada": True,
+        "df_assign": df_assign,
+        "df_uncov": df_uncov if not df_uncov.empty else None,
+        "informe_optimizacion": informe,
+        "cambios_replanificacion": None,
+        "staff": staff,
+        "demand": demand,
+        "historico": historico,
+        "version_historico": version,
+        "conflicto_aprobacion": None,
+        "resumen_mensual": resumen,
+    }, medicion
+
+#Conflicto al aprobar: histórico nuevo y los días ya guardados por otros pasan a ausencias
+def replanificar_conflicto():
+    conflicto = st.session_state["conflicto_aprobacion"]
+    df_assign, staff, demand = st.session_state["df_assign"], st.session_state["staff"], st.session_state["demand"]
+    fechas = pd.to_datetime(df_assign["Fecha"])
+    version = version_historico()
+    historico = cargar_horas_actuales(staff, demand)
+    guardadas = obtener_horas_historicas(ids=conflicto.ids, desde=fechas.min(), hasta=fechas.max())
+    r = replanificar(staff, demand, df_assign, cambios_por_conflicto(df_assign, guardadas), historico=historico)
+    st.session_state.update({
+        "df_assign": r.df_assign,
+        "df_uncov": r.df_uncov if not r.df_uncov.empty else None,
+        "staff": r.staff,
+        "demand": r.demand,
+        "historico": historico,
+        "version_historico": version,
+        "conflicto_aprobacion": None,
+        "informe_optimizacion": None,
+        "cambios_replanificacion": r.cambios,
+        "resumen_mensual": resumen_mensual(r.df_assign),
+        "version_resultado": nueva_version(),
+        #El plan corregido se revisa antes de volver a aprobarlo
+        "aprobacion": "Pendiente",
+    })
 
+#Ejecutar asignación: se lanza como trabajo y la página consulta su avance en cada rerun
+if file_staff is not None and st.button("🚀 Ejecutar asignación"):
     if demand is None:
         st.warning("⚠️ No se ha cargado ninguna demanda de turnos.")
         st.stop()
 
-    if not all(col in demand.columns for col in ["Fecha", "Unidad", "Turno", "Personal_Requerido"]):
+    if not all(col in demand.columns for col in COLUMNAS_DEMANDA):
         st.error("❌ La demanda debe contener las columnas: Fecha, Unidad, Turno, Personal_Requerido")
         st.stop()
 
-    demand_sorted = demand.sort_values(by="Fecha")
-    #st.subheader("📆 Demanda generada")
-    #st.dataframe(demand)
-
-    for _, dem in demand_sorted.iterrows():
-        fecha = dem["Fecha"]
-        unidad = dem["Unidad"]
-        turno = dem["Turno"]
-        req = dem["Personal_Requerido"]
-        assigned_count = 0
-
-        cands = staff[
-            (staff["Unidad_Asignada"] == unidad) &
-            (staff["Turno_Contrato"] == turno) &
-            (~staff["Fechas_No_Disponibilidad"].apply(lambda lst: fecha in lst)) &
-            (staff["ID"].map(lambda x: staff_hours.get(x, 0) + SHIFT_HOURS[turno] <= staff_max_hours[x]))
-        ].copy()
-
-        if not cands.empty:
-            cands["Horas_Asignadas"] = cands["ID"].map(staff_hours)
-            cands["Jornadas_Asignadas"] = cands["ID"].map(lambda x: len(staff_dates[x]))
-
-            def jornada_ok(row):
-                return len(staff_dates[row.ID]) < staff_max_jornadas[row.ID]
-            
-            def consecutive_ok(nurse_id):
-                fechas_asignadas = staff_dates[nurse_id]
-                if not fechas_asignadas: return True
-                # Convertir todas las fechas a datetime.date y ordenarlas
-                fechas_datetime = sorted([datetime.strptime(f, "%Y-%m-%d").date() for f in fechas_asignadas])
-                fecha_actual = datetime.strptime(fecha, "%Y-%m-%d").date()
-                # Verificar si la fecha_actual sería el 8vo día consecutivo
-                consecutivos = 1
-                for i in range(1, 8):
-                    fecha_anterior = fecha_actual - timedelta(days=i)
-                    if fecha_anterior in fechas_datetime:
-                        consecutivos += 1
-                    else: break
-                return consecutivos < 8
-
-            def descanso_12h_ok(nurse_id):
-                fechas_previas = staff_dates[nurse_id]
-                if not fechas_previas:
-                    return True
-                fecha_actual = datetime.strptime(fecha, "%Y-%m-%d")
-                for fecha_ant in fechas_previas:
-                    fecha_prev = datetime.strptime(fecha_ant, "%Y-%m-%d")
-                    if abs((fecha_actual - fecha_prev).total_seconds()) < 12 * 3600:
-                        return False
-                return True
-
-            def hours_ok(row):
-                return staff_hours[row.ID] + SHIFT_HOURS[turno] <= staff_max_hours[row.ID]
-
-            cands = cands[cands.apply(jornada_ok, axis=1)]
-            cands = cands[cands["ID"].apply(consecutive_ok)]
-            cands = cands[cands["ID"].apply(descanso_12h_ok)]
-            cands = cands[cands.apply(hours_ok, axis=1)]
-            cands = cands.sort_values(by="Horas_Asignadas")
-
-        if not cands.empty:
-            for _, cand in cands.iterrows():
-                if assigned_count >= req: break
-                assignments.append({
-                    "Fecha": fecha,
-                    "Unidad": unidad,
-                    "Turno": turno,
-                    "ID_Enfermera": cand.ID,
-                    "Jornada": cand.Jornada,
-                    "Horas": SHIFT_HOURS[turno], # staff_hours[cand.ID] + SHIFT_HOURS[turno]
-                })
-                staff_hours[cand.ID] += staff_hours.get(cand.ID, 0) + SHIFT_HOURS[turno]  # Acumula horas
-                staff_dates[cand.ID].append(fecha)
-                assigned_count += 1
-        if assigned_count < req:
-            uncovered.append({"Fecha": fecha, "Unidad": unidad, "Turno": turno, "Faltan": req - assigned_count})
-
-    df_assign = pd.DataFrame(assignments)
- 
-    df_uncov = pd.DataFrame(uncovered) if uncovered else None 
-
-    st.session_state.update({
-        "asignacion_completada": True,
-        "df_assign": df_assign,
-        "df_uncov": pd.DataFrame(uncovered) if uncovered else None,
-        "uncovered": uncovered  # Nueva línea
-    })
+    try:
+        staff, plantilla = leer_plantilla(file_staff)
+    except ValueError as e:
+        st.error(f"❌ {e}")
+        st.stop()
 
-    df_assign["Fecha"] = pd.to_datetime(df_assign["Fecha"])
-    df_assign["Año"] = df_assign["Fecha"].dt.year
-    df_assign["Mes"] = df_assign["Fecha"].dt.month
+    st.subheader("👩‍⚕️ Personal cargado")
+    st.dataframe(staff)
 
-    st.session_state["resumen_mensual"] = (df_assign.assign(
-        Año=df_assign["Fecha"].dt.year,
-        Mes=df_assign["Fecha"].dt.month
-).groupby(["ID_Enfermera", "Unidad", "Turno", "Jornada", "Año", "Mes"])
- .agg(Horas_Asignadas=("Horas", "sum"),
-      Jornadas_Asignadas=("Fecha", "count"))
- .reset_index()
- .rename(columns={"ID_Enfermera": "ID"}))
+    trabajos.cancelar(st.session_state.get("trabajo_asignacion"))
+    st.session_state["trabajo_asignacion"] = trabajos.lanzar(
+        asignar_en_segundo_plano, staff, plantilla, demand, modo, tiempo_max, procesos, medir_rendimiento,
+        descripcion=f"Asignación {modo.lower()} de {len(staff)} profesionales",
+    )
+
+id_trabajo = st.session_state.get("trabajo_asignacion")
+if id_trabajo is not None:
+    trabajo = trabajos.obtener(id_trabajo)
+    if trabajo is None:
+        st.session_state["trabajo_asignacion"] = None
+        st.warning("⚠️ El trabajo de asignación ya no está disponible (¿se reinició la aplicación?).")
+    elif not trabajo.terminado:
+        texto = f"⏳ {trabajo.descripcion}: día {trabajo.hechos} de {trabajo.total}" if trabajo.total \
+            else f"⏳ {trabajo.descripcion}: preparando…"
+        st.progress(trabajo.fraccion, text=texto)
+        if st.button("⛔ Cancelar asignación"):
+            trabajos.cancelar(id_trabajo)
+        time.sleep(INTERVALO_SONDEO)
+        st.rerun()
+    else:
+        st.session_state["trabajo_asignacion"] = None
+        recogido = trabajos.recoger(id_trabajo)
+        if trabajo.estado == trabajos.COMPLETADO and recogido is None:
+            st.warning("⚠️ El resultado de la asignación ha caducado; vuelve a ejecutarla.")
+        elif trabajo.estado == trabajos.COMPLETADO:
+            resultado, medicion = recogido
+            st.session_state.update(resultado)
+            st.session_state["version_resultado"] = nueva_version()
+            if medicion is not None:
+                st.session_state["rendimiento"] = [medicion]
+        elif trabajo.estado == trabajos.CANCELADO:
+            st.warning("⛔ Asignación cancelada; se mantiene el resultado anterior.")
+        elif isinstance(trabajo.error, ValueError):
+            st.error(f"❌ {trabajo.error}")
+        else:
+            st.error(f"❌ Error inesperado en la asignación: {trabajo.error!r}")
 
 if st.session_state["asignacion_completada"]:
     df_assign = st.session_state["df_assign"].drop(columns=["Confirmado"], errors="ignore")
     df_uncov = st.session_state.get("df_uncov")
+    version = st.session_state["version_resultado"]
     st.success("✅ Asignación completada")
     st.dataframe(df_assign)
+
+    if st.session_state.get("informe_optimizacion") is not None:
+        st.subheader("📈 Cobertura y equidad frente al modo voraz")
+        st.dataframe(st.session_state["informe_optimizacion"])
     
     if df_uncov is not None and not df_uncov.empty:
         st.subheader("⚠️ Turnos sin cubrir")
+        if "Candidatas" in df_uncov.columns:
+            st.caption("Candidatas: enfermeras de la unidad y turno. Rechazo_*: cuántas descartó cada regla "
+                       "(cada enfermera cuenta solo en la primera regla que incumple). En el modo optimizado "
+                       "y tras replanificar se evalúan sobre el plan final.")
         st.dataframe(df_uncov)
-        st.download_button(
-            "⬇️ Descargar turnos sin cubrir",
-            data=to_excel_bytes(df_uncov),
-            file_name=f"Turnos_Sin_Cubrir_{datetime.now().strftime('%Y%m%d')}.xlsx",
-            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+        boton_descarga("⬇️ Descargar turnos sin cubrir", df_uncov,
+                       f"Turnos_Sin_Cubrir_{datetime.now().strftime('%Y%m%d')}",
+                       formato=formato_descarga, version=version)
+
+    #Replanificación incremental: solo se recalculan los días y enfermeras afectados
+    with st.expander("🩹 Replanificar cambios sin rehacer la asignación"):
+        fechas_plan = pd.to_datetime(df_assign["Fecha"]) if not df_assign.empty else pd.Series([pd.Timestamp(date.today())])
+        congelar_hasta = st.date_input(
+            "Mantener sin cambios hasta (incluido)", value=fechas_plan.min().date() - timedelta(days=1)
         )
+        bajas = st.multiselect("Bajas de personal", st.session_state["staff"]["ID"].astype(str).tolist())
+        st.markdown("Ausencias nuevas")
+        ausencias_nuevas = st.data_editor(
+            pd.DataFrame({"ID": pd.Series(dtype=str), "Fecha": pd.Series(dtype=str)}),
+            num_rows="dynamic", key="ausencias_nuevas"
+        )
+        st.markdown("Cambios de demanda (Personal_Requerido = 0 elimina el turno)")
+        demanda_cambiada = st.data_editor(
+            pd.DataFrame({c: pd.Series(dtype=int if c == "Personal_Requerido" else str) for c in COLUMNAS_DEMANDA}),
+            num_rows="dynamic", key="demanda_cambiada"
+        )
+        if st.button("🔁 Replanificar"):
+            cambios = Cambios(
+                ausencias_nuevas=ausencias_nuevas.dropna(),
+                demanda=demanda_cambiada.dropna(),
+                bajas=bajas,
+            )
+            try:
+                r = replanificar(
+                    st.session_state["staff"], st.session_state["demand"], st.session_state["df_assign"],
+                    cambios, congelar_hasta=congelar_hasta, historico=st.session_state.get("historico")
+                )
+            except ValueError as e:
+                st.error(f"❌ {e}")
+                st.stop()
+            st.session_state.update({
+                "df_assign": r.df_assign,
+                "df_uncov": r.df_uncov if not r.df_uncov.empty else None,
+                "staff": r.staff,
+                "demand": r.demand,
+                "informe_optimizacion": None,
+                "cambios_replanificacion": r.cambios,
+                "resumen_mensual": resumen_mensual(r.df_assign),
+                "version_resultado": nueva_version()
+            })
+            st.rerun()
+        if st.session_state.get("cambios_replanificacion") is not None:
+            st.markdown(f"**Última replanificación:** {len(st.session_state['cambios_replanificacion'])} asignaciones cambiadas")
+            st.dataframe(st.session_state["cambios_replanificacion"])
+
+    if st.session_state.get("rendimiento"):
+        with st.expander("⏱️ Rendimiento"):
+            for medicion in st.session_state["rendimiento"]:
+                st.markdown(f"**{medicion.nombre}** ({medicion.inicio:%H:%M:%S})")
+                col1, col2 = st.columns(2)
+                col1.dataframe(medicion.tabla_tramos(), hide_index=True)
+                col2.dataframe(medicion.tabla_contadores(), hide_index=True)
+            st.download_button(
+                "⬇️ Descargar métricas (JSON)",
+                data=json.dumps([m.a_dict() for m in st.session_state["rendimiento"]], indent=2, ensure_ascii=False),
+                file_name=f"Rendimiento_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json",
+                mime="application/json"
+            )
 
     st.markdown("### ✅ Confirmación de asignación")
-    aprobacion = st.radio("¿Deseas aprobar esta asignación?", ["Pendiente", "Aprobar", "Rehacer"], index=0)
+    aprobacion = st.radio("¿Deseas aprobar esta asignación?", ["Pendiente", "Aprobar", "Rehacer"], index=0,
+                          key="aprobacion")
     
     if aprobacion == "Aprobar":
         # Crear DataFrame para guardar (asegurando mayúsculas correctas)
         df_to_save = st.session_state["df_assign"][["Fecha", "Unidad", "Turno", "ID_Enfermera", "Jornada", "Horas"]]
     
-        # Guardar
-        try:
-            guardar_asignaciones(df_to_save)
-            st.success("✅ Datos guardados correctamente")
-            subir_bd_a_drive(FILE_ID)
-            st.success("📥 Datos guardados en la base de datos correctamente.")
-        except Exception as e:
-            st.error(f"❌ Error al guardar: {str(e)}")
+        # Guardar una sola vez por resultado, solo si nadie ha cambiado el histórico usado
+        if st.session_state.get("plan_aprobado") == version:
+            st.success("✅ Esta asignación ya está guardada")
+        elif st.session_state.get("conflicto_aprobacion") is None:
+            with medir("Guardado", activo=medir_rendimiento) as medicion:
+                try:
+                    st.session_state["version_historico"] = aprobar_asignaciones(
+                        df_to_save, st.session_state.get("version_historico", 0)
+                    )
+                    st.session_state["plan_aprobado"] = version
+                    st.success("✅ Datos guardados correctamente")
+                    with tramo("bd.subir_drive"):
+                        subir_bd_a_drive(FILE_ID)
+                    st.success("📥 Datos guardados en la base de datos correctamente.")
+                except ConflictoAprobacion as e:
+                    st.session_state["conflicto_aprobacion"] = e
+                except Exception as e:
+                    st.error(f"❌ Error al guardar: {str(e)}")
+            if medicion is not None:
+                st.session_state["rendimiento"] = st.session_state.get("rendimiento", [])[-1:] + [medicion]
+
+        conflicto = st.session_state.get("conflicto_aprobacion")
+        if conflicto is not None:
+            st.warning(f"⚠️ No se ha guardado nada. {conflicto}")
+            st.dataframe(conflicto.conflictos, hide_index=True)
+            st.button("🔁 Replanificar solo las enfermeras en conflicto", on_click=replanificar_conflicto)
+            st.stop()
 
         if "resumen_mensual" not in st.session_state:
             st.error("No se encontró el resumen mensual")
@@ -294,8 +372,11 @@ if st.session_state["asignacion_completada"]:
 
         #st.subheader("🧾 Resumen Asignación Mensual por profesional")
 
-        st.download_button("⬇️ Descargar planilla asignada", data=to_excel_bytes(st.session_state["df_assign"]), file_name="Planilla_Asignada.xlsx")
-        st.download_button("⬇️ Descargar resumen mensual", data=to_excel_bytes(st.session_state["resumen_mensual"]), file_name="Resumen_Mensual_{datetime.now().strftime('%Y%m%d')}.xlsx",mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
+        boton_descarga("⬇️ Descargar planilla asignada", st.session_state["df_assign"], "Planilla_Asignada",
+                       formato=formato_descarga, version=version)
+        boton_descarga("⬇️ Descargar resumen mensual", st.session_state["resumen_mensual"],
+                       f"Resumen_Mensual_{datetime.now().strftime('%Y%m%d')}",
+                       formato=formato_descarga, version=version)
 
     elif aprobacion == "Rehacer":
         st.session_state["asignacion_completada"] = False
@@ -0,0 +1,268 @@
+"""Replanificación incremental de una asignación ya generada.
+
+En lugar de rehacer todo el horizonte, se parte de la asignación existente y se
+aplican los cambios (ausencias nuevas o retiradas, filas de demanda modificadas,
+altas y bajas de personal). Hasta la fecha de congelación no se toca nada; a
+partir de ella solo se retiran las asignaciones que ya no cumplen las reglas y
+se cubren los huecos de los días afectados por los cambios (los que deja la
+retirada, los de la demanda modificada y los de las enfermeras que salen o
+cambian de puesto), de modo que el resto del plan, huecos antiguos incluidos,
+no cambia.
+"""
+import time
+from dataclasses import dataclass, field
+
+import numpy as np
+import pandas as pd
+
+from motor_asignacion import (
+    COLUMNAS_ASIGNACION, COLUMNAS_DEMANDA, COLUMNAS_MOTIVOS, COLUMNAS_SIN_CUBRIR, MAX_DIAS_CONSECUTIVOS,
+    EstadoEnfermeras, cargar_plantilla, compactar_asignaciones, parse_dates, preparar_demanda,
+)
+from optimizacion import (
+    TIEMPO_MAX_OPTIMIZACION, _ordinales, construir_grupos, grupos_a_dataframes, mejorar_cobertura, motivos_celda,
+)
+
+CLAVE_ASIGNACION = ["Fecha", "Unidad", "Turno", "ID_Enfermera"]
+CLAVE_DEMANDA = ["Fecha", "Unidad", "Turno"]
+
+
+def _vacio(columnas):
+    return pd.DataFrame(columns=columnas)
+
+
+@dataclass
+class Cambios:
+    """Cambios sobre la plantilla y la demanda desde la última asignación.
+
+    - `ausencias_nuevas` / `ausencias_retiradas`: DataFrames con `ID` y `Fecha`.
+    - `demanda`: filas `Fecha, Unidad, Turno, Personal_Requerido` que sustituyen a
+      las existentes (o se añaden); `Personal_Requerido = 0` elimina el turno.
+    - `altas`: filas de plantilla nuevas; si el `ID` ya existe, sustituyen a la anterior.
+    - `bajas`: IDs que dejan la plantilla.
+    """
+    ausencias_nuevas: pd.DataFrame = field(default_factory=lambda: _vacio(["ID", "Fecha"]))
+    ausencias_retiradas: pd.DataFrame = field(default_factory=lambda: _vacio(["ID", "Fecha"]))
+    demanda: pd.DataFrame = field(default_factory=lambda: _vacio(COLUMNAS_DEMANDA))
+    altas: pd.DataFrame = field(default_factory=lambda: _vacio(["ID"]))
+    bajas: list = field(default_factory=list)
+
+
+@dataclass
+class Replanificacion:
+    """Resultado de `replanificar`: datos actualizados, nueva asignación y diferencias"""
+    staff: pd.DataFrame
+    demand: pd.DataFrame
+    df_assign: pd.DataFrame
+    df_uncov: pd.DataFrame
+    cambios: pd.DataFrame  # filas de asignación con `Cambio` = 'Añadida' o 'Retirada'
+
+
+def _fechas_por_id(df):
+    if df is None or df.empty:
+        return {}
+    fechas = pd.to_datetime(df["Fecha"]).dt.strftime("%Y-%m-%d")
+    return fechas.groupby(df["ID"].astype(str)).agg(set).to_dict()
+
+
+def aplicar_cambios(staff, demand, cambios):
+    """Devuelve `(staff, demand)` con `cambios` aplicados"""
+    staff = staff.copy()
+    staff.columns = staff.columns.str.strip()
+    ids = staff["ID"].astype(str)
+
+    if len(cambios.altas):
+        altas = cambios.altas.copy()
+        staff = staff[~ids.isin(altas["ID"].astype(str))]
+        staff = pd.concat([staff, altas], ignore_index=True)
+        ids = staff["ID"].astype(str)
+    if len(cambios.bajas):
+        staff = staff[~ids.isin([str(i) for i in cambios.bajas])].reset_index(drop=True)
+        ids = staff["ID"].astype(str)
+
+    nuevas, retiradas = _fechas_por_id(cambios.ausencias_nuevas), _fechas_por_id(cambios.ausencias_retiradas)
+    if nuevas or retiradas:
+        if "Fechas_No_Disponibilidad" not in staff.columns:
+            staff["Fechas_No_Disponibilidad"] = None
+        columna = []
+        for id_, celda in zip(ids, staff["Fechas_No_Disponibilidad"]):
+            if id_ not in nuevas and id_ not in retiradas:
+                columna.append(celda)
+                continue
+            fechas = (set(parse_dates(celda)) | nuevas.get(id_, set())) - retiradas.get(id_, set())
+            columna.append(", ".join(sorted(fechas)) or None)
+        staff["Fechas_No_Disponibilidad"] = columna
+
+    demand = demand.copy()
+    demand.columns = demand.columns.str.strip()
+    if len(cambios.demanda):
+        cambios_demanda = cambios.demanda[COLUMNAS_DEMANDA].copy()
+        for df in (demand, cambios_demanda):
+            df["Fecha"] = pd.to_datetime(df["Fecha"]).dt.strftime("%Y-%m-%d")
+            df["Unidad"] = df["Unidad"].astype(str)
+            df["Turno"] = df["Turno"].astype(str)
+        claves = pd.MultiIndex.from_frame(cambios_demanda[CLAVE_DEMANDA])
+        demand = demand[~pd.MultiIndex.from_frame(demand[CLAVE_DEMANDA]).isin(claves)]
+        cambios_demanda = cambios_demanda[cambios_demanda["Personal_Requerido"] > 0]
+        demand = pd.concat([demand, cambios_demanda], ignore_index=True)
+    return staff, demand
+
+
+def _reparar(g, corte):
+    """Retira las asignaciones posteriores a la columna `corte` que incumplen alguna regla"""
+    libre = np.arange(g.asignado.shape[1]) > corte
+
+    # Ausencias y descanso
+    for n, d in zip(*np.nonzero(g.asignado & ~g.disponible & libre)):
+        if d > 0:
+            g.quitar(n, d)
+
+    # Tope de jornadas: se retiran primero las más tardías
+    for n in np.flatnonzero(g.cuenta > g.cupo):
+        for d in np.flatnonzero(g.asignado[n] & libre)[::-1]:
+            if g.cuenta[n] <= g.cupo[n]:
+                break
+            g.quitar(n, d)
+
+    # Racha: en cada ventana de MAX_DIAS_CONSECUTIVOS días seguidos se libera el último día libre.
+    # Delante de la columna 0 van los días de racha del histórico, que no se pueden liberar
+    previos = MAX_DIAS_CONSECUTIVOS - 1
+    libre_con_previos = np.concatenate([np.zeros(previos, dtype=bool), libre])
+    extra = g._extra_racha()
+    for n in range(len(g.pos)):
+        while True:
+            fila = np.concatenate([np.arange(previos)[::-1] < extra[n], g.asignado[n]])
+            ventanas = np.lib.stride_tricks.sliding_window_view(fila, MAX_DIAS_CONSECUTIVOS)
+            llenas = np.flatnonzero(ventanas.all(axis=1))
+            dias = [d for d in range(llenas[0], llenas[0] + MAX_DIAS_CONSECUTIVOS) if libre_con_previos[d]] if len(llenas) else []
+            if not dias:
+                break
+            g.quitar(n, dias[-1] - previos)
+
+    # Exceso sobre la demanda: sale quien más horas lleva
+    for d in np.flatnonzero(libre & (g.asignado.sum(axis=0) > g.requerido)):
+        asignadas = np.flatnonzero(g.asignado[:, d])
+        sobran = len(asignadas) - g.requerido[d]
+        for n in asignadas[np.argsort(-g.horas[asignadas], kind="stable")][:sobran]:
+            g.quitar(n, d)
+
+
+def _celdas_cambiadas(df_assign, cambios):
+    """(Fecha, Unidad, Turno) donde los cambios pueden abrir huecos sin pasar por `_reparar`.
+
+    Son las filas de demanda modificadas y los turnos que cubrían las enfermeras
+    dadas de baja o sustituidas por un alta (pueden haber cambiado de unidad o turno).
+    """
+    celdas = set()
+    if len(cambios.demanda):
+        fechas = pd.to_datetime(cambios.demanda["Fecha"]).dt.strftime("%Y-%m-%d")
+        celdas.update(zip(fechas, cambios.demanda["Unidad"].astype(str), cambios.demanda["Turno"].astype(str)))
+    salen = {str(i) for i in cambios.bajas} | set(cambios.altas["ID"].astype(str))
+    if salen:
+        filas = df_assign[df_assign["ID_Enfermera"].astype(str).isin(salen)]
+        celdas.update(zip(filas["Fecha"], filas["Unidad"].astype(str), filas["Turno"].astype(str)))
+    return celdas
+
+
+def _sin_cubrir(demand, df_assign, plantilla, estado, grupos):
+    """Huecos de `demand` según los conteos de `df_assign`, con los motivos de cada uno"""
+    requerido = demand.groupby(CLAVE_DEMANDA, sort=False)["Personal_Requerido"].sum()
+    cubierto = df_assign.groupby(CLAVE_DEMANDA, observed=True).size().reindex(requerido.index).fillna(0)
+    faltan = (requerido - cubierto)
+    faltan = faltan[faltan > 0].astype(int).rename("Faltan").reset_index()
+
+    # Un hueco agrupa todas las filas de su (Fecha, Unidad, Turno): las asignadas no son rechazos
+    motivos, rachas = [], {}
+    dias = _ordinales(faltan["Fecha"]) if len(faltan) else []
+    for dia, unidad, turno in zip(dias, faltan["Unidad"], faltan["Turno"]):
+        g = grupos.get((unidad, turno))
+        if g is None:
+            motivos.append([0] * len(COLUMNAS_MOTIVOS))
+            continue
+        if (unidad, turno) not in rachas:
+            rachas[(unidad, turno)] = g.racha_libre()
+        d = int(dia) - g.dia0
+        motivos.append(motivos_celda(plantilla, estado, g, d, int(g.asignado[:, d].sum()), rachas[(unidad, turno)]))
+    motivos = pd.DataFrame(motivos, columns=COLUMNAS_MOTIVOS, index=faltan.index, dtype="int64")
+    return pd.concat([faltan[COLUMNAS_SIN_CUBRIR], motivos], axis=1)
+
+
+def cambios_por_conflicto(df_assign, guardadas):
+    """`Cambios` que reflejan asignaciones guardadas por otro planificador.
+
+    `guardadas` son las filas de la base de datos de las enfermeras en conflicto
+    dentro del horizonte del plan (p. ej. `db_manager.obtener_horas_historicas`).
+    Sus días pasan a ser ausencias, salvo los que coinciden con el propio plan,
+    de modo que `replanificar` con el histórico recién leído solo retira y vuelve
+    a cubrir lo que choca con esas enfermeras.
+    """
+    if guardadas is None or guardadas.empty:
+        return Cambios()
+    guardadas = guardadas.assign(Fecha=pd.to_datetime(guardadas["Fecha"]).dt.strftime("%Y-%m-%d"))
+    propias = pd.MultiIndex.from_arrays([
+        pd.to_datetime(df_assign["Fecha"]).dt.strftime("%Y-%m-%d"), df_assign["Unidad"].astype(str),
+        df_assign["Turno"].astype(str), df_assign["ID_Enfermera"].astype(str),
+    ])
+    ajenas = guardadas[~guardadas.set_index(CLAVE_ASIGNACION).index.isin(propias)]
+    ausencias = (ajenas.rename(columns={"ID_Enfermera": "ID"})[["ID", "Fecha"]]
+                 .drop_duplicates(ignore_index=True))
+    return Cambios(ausencias_nuevas=ausencias)
+
+
+def replanificar(staff, demand, df_assign, cambios, congelar_hasta=None, historico=None,
+                 tiempo_max=TIEMPO_MAX_OPTIMIZACION):
+    """Actualiza `df_assign` tras aplicar `cambios` sin tocar nada hasta `congelar_hasta`.
+
+    Después de esa fecha se conservan las asignaciones que siguen siendo válidas,
+    se retiran las que incumplen alguna regla (o sobran) y se cubren, con el mismo
+    criterio que el modo optimizado, los huecos que abren los cambios. Los huecos
+    que ya tenía el plan se mantienen. Devuelve una `Replanificacion`.
+    """
+    inicio = time.perf_counter()
+    staff, demand = aplicar_cambios(staff, demand, cambios)
+    plantilla = cargar_plantilla(staff)
+    demand_prep = preparar_demanda(demand)
+
+    df_assign = df_assign[COLUMNAS_ASIGNACION].copy()
+    df_assign["Fecha"] = pd.to_datetime(df_assign["Fecha"]).dt.strftime("%Y-%m-%d")
+    corte = (pd.Timestamp(congelar_hasta).strftime("%Y-%m-%d") if congelar_hasta is not None else "")
+    congeladas = df_assign[df_assign["Fecha"] <= corte]
+    anteriores = df_assign[df_assign["Fecha"] > corte]
+
+    estado = EstadoEnfermeras.inicial(plantilla, historico)
+    dias = _ordinales(demand_prep["Fecha"])
+    grupos = construir_grupos(plantilla, demand_prep, dias, estado, df_assign)
+    dia_corte = _ordinales(pd.Series([corte]))[0] if corte else -1
+    cambiadas = pd.DataFrame(list(_celdas_cambiadas(df_assign, cambios)), columns=CLAVE_DEMANDA)
+    limite = inicio + tiempo_max
+    for g in grupos.values():
+        col = dia_corte - g.dia0 if corte else 0
+        faltaban = g.faltan()
+        _reparar(g, col)
+        g.disponible[:, :max(col + 1, 0)] = False
+        # Solo se cubren los huecos que abren los cambios; los que ya tenía el plan se dejan
+        propias = cambiadas[(cambiadas["Unidad"] == g.unidad) & (cambiadas["Turno"] == g.turno)]
+        columnas = np.flatnonzero(g.faltan() > faltaban)
+        if len(propias):
+            columnas = np.union1d(columnas, _ordinales(propias["Fecha"]) - g.dia0)
+        if len(columnas) and time.perf_counter() < limite:
+            mejorar_cobertura(g, limite, dias=columnas)
+
+    nuevas, _ = grupos_a_dataframes(plantilla, demand_prep, dias, grupos, estado)
+    nuevas = nuevas[nuevas["Fecha"] > corte]
+    df_nuevo = pd.concat([congeladas, nuevas], ignore_index=True)
+
+    antes = anteriores.set_index(CLAVE_ASIGNACION).index
+    despues = nuevas.set_index(CLAVE_ASIGNACION).index
+    diferencias = pd.concat([
+        nuevas[~despues.isin(antes)].assign(Cambio="Añadida"),
+        anteriores[~antes.isin(despues)].assign(Cambio="Retirada"),
+    ], ignore_index=True).sort_values(["Fecha", "Unidad", "Turno"], kind="stable", ignore_index=True)
+
+    return Replanificacion(
+        staff=staff,
+        demand=demand,
+        df_assign=compactar_asignaciones(df_nuevo),
+        df_uncov=_sin_cubrir(demand_prep, df_nuevo, plantilla, estado, grupos),
+        cambios=diferencias,
+    )
@@ -1,66 +1,46 @@
+import math
 import streamlit as st
-import pandas as pd
-import sqlite3
-from io import BytesIO
-from pathlib import Path
-
-DB_PATH = Path("turnos.db")
-
-def cargar_resumen_mensual():
-    conn = sqlite3.connect(DB_PATH)
-    df = pd.read_sql_query("SELECT * FROM resumen_mensual", conn)
-    conn.close()
-    return df
-
-def to_excel_bytes(df):
-    output = BytesIO()
-    with pd.ExcelWriter(output, engine="openpyxl") as writer:
-        df.to_excel(writer, index=False, sheet_name="Resumen")
-    return output.getvalue()
+from db_manager import (
+    FILAS_POR_PAGINA, contar_resumen_mensual, init_db, obtener_resumen_mensual, valores_resumen_mensual,
+    version_resumen,
+)
+from exportar import FORMATOS, boton_descarga, formatos_disponibles
 
 st.set_page_config(page_title="Resumen Mensual – SERMAS", layout="wide")
 st.title("📊 Visualizador de Resumen Mensual por Profesional")
 
-df = cargar_resumen_mensual()
+init_db()
+valores = valores_resumen_mensual()
 
-if df.empty:
+if not valores["años"]:
     st.warning("⚠️ No hay datos registrados en la tabla resumen_mensual.")
     st.stop()
 
-# Conversión de tipos
-df["Año"] = df["Año"].astype(int)
-df["Mes"] = df["Mes"].astype(int)
-
-# Filtros
+# Los filtros se aplican en SQL; con todas las opciones marcadas no se filtra esa columna
 st.sidebar.header("🔍 Filtros")
-
-years = sorted(df["Año"].unique())
-months = sorted(df["Mes"].unique())
-unidades = df["Unidad"].unique().tolist()
-turnos = df["Turno"].unique().tolist()
-jornadas = df["Jornada"].unique().tolist()
-
-año_sel = st.sidebar.multiselect("Año", years, default=years)
-mes_sel = st.sidebar.multiselect("Mes", months, default=months)
-unidad_sel = st.sidebar.multiselect("Unidad", unidades, default=unidades)
-turno_sel = st.sidebar.multiselect("Turno", turnos, default=turnos)
-jornada_sel = st.sidebar.multiselect("Jornada", jornadas, default=jornadas)
-
-# Aplicar filtros
-df_filtrado = df[
-    (df["Año"].isin(año_sel)) &
-    (df["Mes"].isin(mes_sel)) &
-    (df["Unidad"].isin(unidad_sel)) &
-    (df["Turno"].isin(turno_sel)) &
-    (df["Jornada"].isin(jornada_sel))
-]
+etiquetas = {"años": "Año", "meses": "Mes", "unidades": "Unidad", "turnos": "Turno", "jornadas": "Jornada"}
+filtros = {}
+for argumento, etiqueta in etiquetas.items():
+    opciones = valores[argumento]
+    seleccion = st.sidebar.multiselect(etiqueta, opciones, default=opciones)
+    filtros[argumento] = None if len(seleccion) == len(opciones) else seleccion
+formato = st.sidebar.selectbox("Formato de descarga", formatos_disponibles(), format_func=lambda f: FORMATOS[f][0])
+filas_pagina = st.sidebar.selectbox("Filas por página", [100, FILAS_POR_PAGINA, 2000], index=1)
+
+totales = contar_resumen_mensual(**filtros)
+paginas = max(1, math.ceil(totales["filas"] / filas_pagina))
 
 st.markdown("### 📋 Datos filtrados")
-st.dataframe(df_filtrado, use_container_width=True)
-
-st.download_button(
-    label="⬇️ Descargar resumen filtrado en Excel",
-    data=to_excel_bytes(df_filtrado),
-    file_name="Resumen_Mensual_Filtrado.xlsx",
-    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-)
+col1, col2, col3 = st.columns(3)
+col1.metric("Filas", f"{totales['filas']:,}")
+col2.metric("Jornadas", f"{totales['jornadas']:,}")
+col3.metric("Horas", f"{totales['horas']:,.1f}")
+
+pagina = st.number_input(f"Página (de {paginas})", min_value=1, max_value=paginas, value=1, step=1)
+df_pagina = obtener_resumen_mensual(limite=filas_pagina, desplazamiento=(pagina - 1) * filas_pagina, **filtros)
+st.dataframe(df_pagina, use_container_width=True)
+
+# La descarga incluye todas las filas filtradas, pero solo se consultan al preparar el archivo
+version = (version_resumen(), tuple((k, tuple(v) if v is not None else None) for k, v in filtros.items()))
+boton_descarga("⬇️ Descargar resumen filtrado", lambda: obtener_resumen_mensual(**filtros),
+               "Resumen_Mensual_Filtrado", formato=formato, version=version, sheet_name="Resumen")
@@ -0,0 +1,229 @@
+"""Sincronización de la base de datos local con un almacenamiento remoto.
+
+El remoto es intercambiable: `RemotoDrive` descarga de Google Drive con gdown y
+`RemotoDirectorio` usa una carpeta local (útil para pruebas o una unidad de red).
+Junto a la base de datos se guarda un manifiesto `<bd>.sync.json` con la versión
+remota y los checksums de la última sincronización, de modo que:
+
+- solo se descarga si el remoto ha cambiado, y como mucho una vez por proceso;
+- la copia nueva se escribe en un temporal y se sustituye con un rename atómico;
+- nunca se sobrescribe una base de datos local con cambios aún no subidos; una
+  base de datos local sin manifiesto (anterior a esta sincronización) cuenta como
+  tal, porque no hay forma de saber si se llegó a subir.
+"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+from pathlib import Path
+
+CABECERA_SQLITE = b"SQLite format 3\x00"
+
+_sincronizados = set()
+_sincronizados_lock = threading.Lock()
+
+
+def sha256_archivo(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for bloque in iter(lambda: f.read(1 << 20), b""):
+            h.update(bloque)
+    return h.hexdigest()
+
+
+class RemotoDrive:
+    """Archivo de Google Drive identificado por su FILE_ID"""
+
+    def __init__(self, file_id):
+        self.file_id = file_id
+        self.url = f"https://drive.google.com/uc?id={file_id}"
+
+    @property
+    def clave(self):
+        return f"drive:{self.file_id}"
+
+    def version(self):
+        """ETag o fecha de modificación del archivo remoto; None si Drive no la expone"""
+        try:
+            import requests
+            r = requests.head(self.url, allow_redirects=True, timeout=10)
+            etag = r.headers.get("ETag") or r.headers.get("Last-Modified")
+            if etag:
+                return f"{etag}|{r.headers.get('Content-Length', '')}"
+        except Exception:
+            pass
+        return None
+
+    def descargar(self, destino):
+        import gdown
+        if gdown.download(self.url, str(destino), quiet=True) is None:
+            raise IOError(f"No se pudo descargar {self.url}")
+
+    def subir(self, origen):
+        raise NotImplementedError(
+            "Subida automática a Google Drive aún no implementada directamente. "
+            "Usa el archivo generado y súbelo manualmente."
+        )
+
+
+class RemotoDirectorio:
+    """Carpeta que hace de remoto: guarda `nombre` y su checksum en `nombre.sha256`"""
+
+    def __init__(self, directorio, nombre="turnos.db"):
+        self.directorio = Path(directorio)
+        self.nombre = nombre
+
+    @property
+    def clave(self):
+        return f"dir:{self.directorio.resolve() / self.nombre}"
+
+    @property
+    def _archivo(self):
+        return self.directorio / self.nombre
+
+    @property
+    def _manifiesto(self):
+        return self.directorio / f"{self.nombre}.sha256"
+
+    def version(self):
+        if self._manifiesto.exists():
+            return self._manifiesto.read_text().strip()
+        if self._archivo.exists():
+            st = self._archivo.stat()
+            return f"{st.st_mtime_ns}|{st.st_size}"
+        return None
+
+    def descargar(self, destino):
+        if not self._archivo.exists():
+            raise IOError(f"No existe {self._archivo}")
+        shutil.copyfile(self._archivo, destino)
+
+    def subir(self, origen):
+        self.directorio.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.directorio, prefix=f".{self.nombre}.")
+        os.close(fd)
+        shutil.copyfile(origen, tmp)
+        os.replace(tmp, self._archivo)
+        self._manifiesto.write_text(sha256_archivo(self._archivo))
+
+
+def _ruta_manifiesto(db_path):
+    return Path(f"{db_path}.sync.json")
+
+
+def leer_manifiesto(db_path):
+    try:
+        return json.loads(_ruta_manifiesto(db_path).read_text())
+    except (OSError, ValueError):
+        return {}
+
+
+def _escribir_manifiesto(db_path, datos):
+    ruta = _ruta_manifiesto(db_path)
+    tmp = ruta.with_name(ruta.name + ".tmp")
+    tmp.write_text(json.dumps(datos, indent=2))
+    os.replace(tmp, ruta)
+
+
+def _checksum_local(db_path):
+    """Checksum de la BBDD local tras volcar el WAL, para no pasar por alto cambios pendientes"""
+    import db_manager
+    if Path(db_path).resolve() == Path(db_manager.DB_PATH).resolve():
+        db_manager.obtener_conexion().execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    return sha256_archivo(db_path)
+
+
+def tiene_cambios_locales(db_path):
+    """True si la BBDD local ha cambiado desde la última sincronización registrada.
+
+    Sin manifiesto no hay sincronización registrada: una BBDD existente cuenta como cambiada.
+    """
+    db_path = Path(db_path)
+    if not db_path.exists():
+        return False
+    manifiesto = leer_manifiesto(db_path)
+    return manifiesto.get("local_sha256") != _checksum_local(db_path)
+
+
+def _sustituir_bd(tmp, db_path):
+    """Reemplaza la BBDD por `tmp` cerrando antes las conexiones y descartando su WAL"""
+    from db_manager import cerrar_conexiones
+    cerrar_conexiones()
+    for sufijo in ("-wal", "-shm"):
+        Path(f"{db_path}{sufijo}").unlink(missing_ok=True)
+    os.replace(tmp, db_path)
+
+
+def sincronizar_bd(remoto, db_path, forzar=False):
+    """Trae la BBDD de `remoto` a `db_path` si hace falta. Devuelve True si la ha sustituido.
+
+    La comprobación se hace una sola vez por proceso y remoto salvo que `forzar` sea True.
+    """
+    db_path = Path(db_path)
+    clave = (remoto.clave, str(db_path.resolve()))
+    with _sincronizados_lock:
+        if clave in _sincronizados and not forzar:
+            return False
+        _sincronizados.add(clave)
+
+    manifiesto = leer_manifiesto(db_path)
+    if tiene_cambios_locales(db_path):
+        if manifiesto:
+            print("⚠️ La base de datos local tiene cambios sin subir; no se descarga la remota")
+        else:
+            print("⚠️ La base de datos local no tiene registro de sincronización; se conserva y no se "
+                  "descarga la remota (súbela o retírala para volver a sincronizar)")
+        return False
+
+    version = remoto.version()
+    if db_path.exists() and version is not None and version == manifiesto.get("remote_version"):
+        return False
+
+    fd, tmp = tempfile.mkstemp(dir=db_path.parent, prefix=f".{db_path.name}.", suffix=".tmp")
+    os.close(fd)
+    try:
+        remoto.descargar(tmp)
+        with open(tmp, "rb") as f:
+            if f.read(len(CABECERA_SQLITE)) != CABECERA_SQLITE:
+                raise IOError("El archivo descargado no es una base de datos SQLite")
+        checksum = sha256_archivo(tmp)
+        if db_path.exists() and checksum == manifiesto.get("remote_sha256"):
+            # Sin versión remota fiable: el contenido coincide con lo ya sincronizado
+            os.unlink(tmp)
+            return False
+        _sustituir_bd(tmp, db_path)
+    except Exception:
+        # No se reintenta en este proceso: un remoto caído no debe costar una descarga por rerun
+        Path(tmp).unlink(missing_ok=True)
+        raise
+
+    _escribir_manifiesto(db_path, {
+        "remoto": remoto.clave,
+        "remote_version": version,
+        "remote_sha256": checksum,
+        "local_sha256": checksum,
+    })
+    return True
+
+
+def marcar_sincronizado(db_path):
+    """Toma el estado local actual como sincronizado (p. ej. tras migrar una copia recién bajada)"""
+    manifiesto = leer_manifiesto(db_path)
+    if manifiesto:
+        manifiesto["local_sha256"] = _checksum_local(db_path)
+        _escribir_manifiesto(db_path, manifiesto)
+
+
+def subir_bd(remoto, db_path):
+    """Sube la BBDD local al remoto y la marca como sincronizada"""
+    db_path = Path(db_path)
+    checksum = _checksum_local(db_path)
+    remoto.subir(db_path)
+    _escribir_manifiesto(db_path, {
+        "remoto": remoto.clave,
+        "remote_version": remoto.version(),
+        "remote_sha256": checksum,
+        "local_sha256": checksum,
+    })
@@ -0,0 +1,151 @@
+"""Trabajos en segundo plano (asignaciones largas) con progreso y cancelación.
+
+Streamlit vuelve a ejecutar la página con cada interacción, y un cálculo lanzado
+dentro de esa ejecución se pierde si el usuario toca un widget. Aquí cada trabajo
+corre en un hilo del proceso y queda en un registro común a todas las sesiones:
+la página guarda solo el ID, consulta el estado en cada rerun y recoge el
+resultado al terminar. Al recogerlo el registro lo suelta y del trabajo queda solo
+el estado; los resultados que nadie recoge caducan a los CADUCIDAD_RESULTADO.
+
+    id_trabajo = lanzar(ejecutar_asignacion, staff, demand, descripcion="Asignación")
+    trabajo = obtener(id_trabajo)   # estado, hechos / total, error
+    resultado = recoger(id_trabajo) # una sola vez, cuando trabajo.estado == COMPLETADO
+    cancelar(id_trabajo)
+
+La función recibe el argumento `avance(hechos, total)`, que actualiza el progreso
+y lanza `TrabajoCancelado` si se ha pedido cancelar; así el trabajo se detiene en
+el siguiente punto de avance sin dejar resultados a medias.
+"""
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+
+MAX_TRABAJOS_SIMULTANEOS = 2
+MAX_TRABAJOS_GUARDADOS = 50
+CADUCIDAD_RESULTADO = timedelta(minutes=30)
+
+PENDIENTE = "pendiente"
+EN_CURSO = "en curso"
+COMPLETADO = "completado"
+CANCELADO = "cancelado"
+ERROR = "error"
+TERMINADOS = {COMPLETADO, CANCELADO, ERROR}
+
+
+class TrabajoCancelado(Exception):
+    """Lanzada por `Trabajo.avance` cuando se ha pedido cancelar el trabajo"""
+
+
+@dataclass
+class Trabajo:
+    """Estado de un trabajo del registro"""
+    id: str
+    descripcion: str
+    creado: datetime = field(default_factory=datetime.now)
+    estado: str = PENDIENTE
+    hechos: int = 0
+    total: int = 0
+    resultado: object = None
+    error: Exception = None
+    fin: datetime = None
+    _cancelacion: threading.Event = field(default_factory=threading.Event, repr=False)
+
+    @property
+    def terminado(self):
+        return self.estado in TERMINADOS
+
+    @property
+    def fraccion(self):
+        return min(1.0, self.hechos / self.total) if self.total else 0.0
+
+    def avance(self, hechos, total):
+        """Registra el progreso; interrumpe el trabajo si se ha pedido cancelarlo"""
+        self.hechos, self.total = int(hechos), int(total)
+        if self._cancelacion.is_set():
+            raise TrabajoCancelado(self.id)
+
+
+_registro = OrderedDict()
+_lock = threading.Lock()
+_ejecutor = None
+
+
+def _obtener_ejecutor():
+    global _ejecutor
+    if _ejecutor is None:
+        _ejecutor = ThreadPoolExecutor(max_workers=MAX_TRABAJOS_SIMULTANEOS, thread_name_prefix="trabajo")
+    return _ejecutor
+
+
+def _purgar():
+    """Olvida los trabajos terminados más antiguos por encima de MAX_TRABAJOS_GUARDADOS
+    y suelta los resultados sin recoger que han caducado"""
+    sobran = len(_registro) - MAX_TRABAJOS_GUARDADOS
+    for id_trabajo in [i for i, t in _registro.items() if t.terminado][:max(0, sobran)]:
+        del _registro[id_trabajo]
+    limite = datetime.now() - CADUCIDAD_RESULTADO
+    for trabajo in _registro.values():
+        if trabajo.terminado and trabajo.fin is not None and trabajo.fin < limite:
+            trabajo.resultado = None
+
+
+def _ejecutar(trabajo, funcion, args, kwargs):
+    try:
+        if trabajo._cancelacion.is_set():
+            raise TrabajoCancelado(trabajo.id)
+        trabajo.estado = EN_CURSO
+        # El resultado se guarda antes que el estado: quien vea COMPLETADO ya lo encuentra
+        trabajo.resultado = funcion(*args, avance=trabajo.avance, **kwargs)
+        trabajo.estado = COMPLETADO
+    except TrabajoCancelado:
+        trabajo.estado = CANCELADO
+    except Exception as e:
+        trabajo.error = e
+        trabajo.estado = ERROR
+    finally:
+        trabajo.fin = datetime.now()
+
+
+def lanzar(funcion, *args, descripcion="", **kwargs):
+    """Encola `funcion(*args, avance=..., **kwargs)` y devuelve el ID del trabajo"""
+    trabajo = Trabajo(id=uuid.uuid4().hex[:12], descripcion=descripcion)
+    with _lock:
+        _registro[trabajo.id] = trabajo
+        _purgar()
+        _obtener_ejecutor().submit(_ejecutar, trabajo, funcion, args, kwargs)
+    return trabajo.id
+
+
+def obtener(id_trabajo):
+    """Trabajo con ese ID, o None si no existe (p. ej. tras reiniciar el servidor)"""
+    with _lock:
+        return _registro.get(id_trabajo)
+
+
+def recoger(id_trabajo):
+    """Resultado del trabajo completado; el registro deja de guardarlo, así que solo
+    se obtiene una vez (None si no ha terminado, no existe o ya se recogió)"""
+    with _lock:
+        trabajo = _registro.get(id_trabajo)
+        if trabajo is None or trabajo.estado != COMPLETADO:
+            return None
+        resultado, trabajo.resultado = trabajo.resultado, None
+        return resultado
+
+
+def cancelar(id_trabajo):
+    """Pide cancelar el trabajo; devuelve False si ya había terminado o no existe"""
+    trabajo = obtener(id_trabajo)
+    if trabajo is None or trabajo.terminado:
+        return False
+    trabajo._cancelacion.set()
+    return True
+
+
+def listar():
+    """Todos los trabajos del registro, del más antiguo al más reciente"""
+    with _lock:
+        return list(_registro.values())
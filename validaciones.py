@@ -1,20 +1,63 @@
+import pandas as pd
+from datetime import date, timedelta
+
+from motor_asignacion import BASE_MAX_HOURS, MIN_DESCANSO_HORAS
+
+def verificar_propuestas(propuestas):
+    """Comprueba en bloque un conjunto de propuestas (ID, Horas, Fecha, Turno_Contrato).
+
+    Hace dos lecturas para todas las propuestas y cruza el resultado en memoria:
+    los acumulados anuales de sus enfermeras (cada propuesta se compara con los de
+    su año; sin fecha, el año en curso) y sus asignaciones entre la primera y la
+    última fecha propuestas, de las que se toma la última hasta cada propuesta.
+    Una jornada anterior a ese rango está al menos un día antes y no afecta al
+    descanso. Cada propuesta se evalúa por separado frente al histórico de la
+    base de datos.
+    Devuelve una copia de `propuestas` con las columnas booleanas `Limite_OK`,
+    `Disponible_OK` y `Valida`.
+    """
+    from db_manager import obtener_acumulados_anuales, obtener_horas_historicas
+
+    propuestas = propuestas.copy()
+    ids = propuestas["ID"].astype(str)
+    fechas = pd.to_datetime(propuestas["Fecha"]).dt.normalize().astype("datetime64[ns]") if "Fecha" in propuestas else None
+    años = fechas.dt.year if fechas is not None else pd.Series(date.today().year, index=propuestas.index)
+
+    if "Horas" in propuestas:
+        acumulados = obtener_acumulados_anuales(ids=ids.unique())
+        horas = acumulados.set_index(["ID_Enfermera", "Año"])["Horas_Acumuladas"]
+        claves = pd.MultiIndex.from_arrays([ids, años.astype(int)])
+        horas_actuales = pd.Series(horas.reindex(claves).fillna(0).to_numpy(dtype=float), index=propuestas.index)
+        limite = propuestas["Turno_Contrato"].map(BASE_MAX_HOURS).fillna(BASE_MAX_HOURS["Mañana"])
+        propuestas["Limite_OK"] = (horas_actuales + propuestas["Horas"].astype(float)) <= limite
+    else:
+        propuestas["Limite_OK"] = True
+
+    if fechas is not None:
+        guardadas = obtener_horas_historicas(ids=ids.unique(), desde=fechas.min(), hasta=fechas.max())
+        guardadas = pd.DataFrame({"ID": guardadas["ID_Enfermera"].astype(str),
+                                  "Fecha": pd.to_datetime(guardadas["Fecha"]).astype("datetime64[ns]")}).drop_duplicates()
+        # Última fecha trabajada hasta cada propuesta (incluido el propio día)
+        cruce = pd.merge_asof(
+            pd.DataFrame({"ID": ids, "Fecha": fechas, "fila": range(len(propuestas))}).sort_values("Fecha"),
+            guardadas.assign(Ultima=guardadas["Fecha"]).sort_values("Fecha"),
+            on="Fecha", by="ID", direction="backward",
+        ).sort_values("fila")
+        ultima = pd.Series(cruce["Ultima"].to_numpy(), index=propuestas.index)
+        descanso = fechas - ultima
+        propuestas["Disponible_OK"] = ultima.isna() | (descanso >= timedelta(hours=MIN_DESCANSO_HORAS))
+    else:
+        propuestas["Disponible_OK"] = True
+
+    propuestas["Valida"] = propuestas["Limite_OK"] & propuestas["Disponible_OK"]
+    return propuestas
 
 def verificar_limites(id_enfermera, horas_nuevas, turno_contrato):
     """Usa datos reales de la base de datos"""
-    from db_manager import obtener_horas_acumuladas
-    df = obtener_horas_acumuladas()
-    horas_actuales = df.loc[df["ID"] == id_enfermera, "Horas_Acumuladas"].sum()
-    limite = 1470 if turno_contrato == "Noche" else 1642.5
-    return (horas_actuales + horas_nuevas) <= limite
+    propuesta = pd.DataFrame([{"ID": id_enfermera, "Horas": horas_nuevas, "Turno_Contrato": turno_contrato}])
+    return bool(verificar_propuestas(propuesta)["Limite_OK"].iloc[0])
 
 def verificar_disponibilidad(id_enfermera, fecha):
     """Verifica disponibilidad considerando asignaciones existentes"""
-    from db_manager import obtener_horas_historicas
-    
-    df = obtener_horas_historicas(id_enfermera)
-    if df.empty:
-        return True
-        
-    # Verificar descanso de 12h
-    ultima_fecha = pd.to_datetime(df['Fecha'].max())
-    return (pd.to_datetime(fecha) - ultima_fecha) >= timedelta(hours=12)
+    propuesta = pd.DataFrame([{"ID": id_enfermera, "Fecha": fecha}])
+    return bool(verificar_propuestas(propuesta)["Disponible_OK"].iloc[0])